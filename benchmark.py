@@ -0,0 +1,283 @@
+###
+### benchmark.py
+###
+### Benchmarks for reading, cleaning, aggregating and plotting, on synthetic data
+### with the same columns as the OpenAlex scores CSV and the scopus exports.
+###
+###    python benchmark.py --rows 10000 1000000 --dir bench
+###
+### Synthetic files are written to --dir the first time each size is used (the
+### largest sizes take a while to generate) and reused afterwards.  Each size is run
+### in a fresh process, so the peak memory reported for a stage covers that stage
+### and the ones before it for that size only.  Scores files with more than
+### --stream-rows rows are read in chunks with pubdata.stream_aggregates, as they
+### may not fit in memory, and the time of each stage is summed over the chunks.
+###
+
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from universities import *
+import pubdata
+import scopusdata
+import render
+from instrument import peak_rss, stages
+
+# University column variants that cleanAffiliation resolves to the universities (or GMU)
+univvariants = universities + [
+    'George Mason University',
+    'Duke', 'Duke Univeristy', 'The Ohio State University', 'UNC',
+    'University of North Carolina at Chapel Hill', 'Vanderbilt',
+    'The University of Alabama at Birmingham', 'University of Pittsburg',
+    'Virginia Tech University',
+    'Department of Computer Science, University of Virginia',
+    'Dept. of Statistics, University of Michigan',
+    'Computer Science, Northwestern University',
+]
+
+departments = ['Department of Computer Science', 'Dept. of Electrical Engineering',
+               'Computer Science', 'School of Medicine', 'Department of Statistics',
+               'Machine Learning Department', 'Data Science Institute', 'Department of Linguistics']
+institutions = uvapeers + ['Stanford University', 'MIT', 'Google Research', 'Google Brain',
+                           'Carnegie Mellon University', 'University of Texas', 'UT Austin',
+                           'Princeton', 'University of Illinois at Urbana-Champaign',
+                           'Microsoft Research', 'Tsinghua University', 'ETH Zurich',
+                           'University of Toronto', 'Penn State University', 'UC Berkeley']
+cities = ['Charlottesville', 'Durham', 'Atlanta', 'Evanston', 'Columbus', 'Seattle', 'Pittsburgh',
+          'Ann Arbor', 'Nashville', 'Blacksburg', 'Mountain View', 'Cambridge', 'Beijing', 'Zurich']
+countries = ['United States', 'China', 'Switzerland', 'Canada', 'United Kingdom']
+
+def pubs_file(dirname, nrows):
+    return os.path.join(dirname, 'publications-%d.csv' % nrows)
+
+def scopus_files(dirname, nrows):
+    return [(os.path.join(dirname, '%s-%d-scopus.csv' % (conf, nrows)), conf)
+            for conf in ['NeurIPS', 'AAAI', 'ICML', 'ICLR']]
+
+def write_pubs(fname, nrows, seed=0, chunk=100000):
+    """
+    Synthetic OpenAlex scores CSV with nrows papers (plus the extra second row that
+    pubtrends skips).
+    """
+
+    rng = np.random.default_rng(seed)
+    with open(fname, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['publication_date', 'University', 'cited_by_count', 'Year', 'Area']
+                        + pubdata.areas)
+        writer.writerow([''] * (5 + len(pubdata.areas)))
+
+        for start in range(0, nrows, chunk):
+            n = min(chunk, nrows - start)
+            year = rng.integers(pubdata.startyear - 5, pubdata.endyear + 2, n)
+            univ = rng.integers(0, len(univvariants), n)
+            cites = rng.geometric(0.05, n)
+            area = rng.integers(0, len(pubdata.areas), n)
+            # topic scores are mostly low, with a long tail towards 1
+            scores = rng.beta(0.5, 2.0, (n, len(pubdata.areas)))
+
+            writer.writerows([['%d-06-01' % year[i], univvariants[univ[i]], cites[i], year[i],
+                               pubdata.areas[area[i]]] + ['%.4f' % s for s in scores[i]]
+                              for i in range(n)])
+
+def affiliation_string(rng):
+    # like scopus: "Department, Institution, City, Country" for each of 1-5 authors' places
+    return ';'.join(', '.join([departments[rng.integers(len(departments))],
+                               institutions[rng.integers(len(institutions))],
+                               cities[rng.integers(len(cities))],
+                               countries[rng.integers(len(countries))]])
+                    for i in range(rng.integers(1, 6)))
+
+def write_scopus(fname, conf, nrows, seed=0):
+    """
+    Synthetic scopus export with nrows papers, including columns the reader ignores.
+    """
+
+    rng = np.random.default_rng(seed)
+    with open(fname, 'w', newline='', encoding='ISO-8859-1') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Authors', 'Author(s) ID', 'Title', 'Year', 'Source title', 'Volume',
+                         'Cited by', 'DOI', 'Link', 'Affiliations', 'Abstract',
+                         'Conference name', 'Document Type', 'EID'])
+        for i in range(nrows):
+            year = int(rng.integers(scopusdata.minyear - 3, scopusdata.maxyear + 2))
+            writer.writerow(['A. Author; B. Author', '1234;5678', '%s paper %d on learning' % (conf, i),
+                             year, conf + ' Proceedings', '', int(rng.geometric(0.02)),
+                             '10.0000/%s.%d' % (conf, i), '', affiliation_string(rng),
+                             'An abstract that nobody reads. ' * 5,
+                             '%s %d' % (conf, year), 'Conference Paper', '2-s2.0-%s%d' % (conf, i)])
+
+def record(results, dataset, stage, nrows, seconds):
+    # nrows is None for stages not done per row (rendering)
+    results.append({'dataset': dataset, 'stage': stage, 'rows': nrows, 'seconds': seconds,
+                    'rows_per_sec': nrows / seconds if nrows and seconds > 0 else None,
+                    'peak_rss_mb': peak_rss()})
+
+def timed(results, dataset, stage, nrows, fn, *args):
+    start = time.perf_counter()
+    value = fn(*args)
+    record(results, dataset, stage, nrows, time.perf_counter() - start)
+    return value
+
+def timed_stages(results, dataset, names, rest, nrows, fn, *args):
+    """
+    Run fn, recording the time it spent in each of the instrument stages in names, and
+    the rest of its time as stage rest.
+    """
+
+    before = {name: stages.get(name, {'seconds': 0.0})['seconds'] for name in names}
+    start = time.perf_counter()
+    value = fn(*args)
+    seconds = time.perf_counter() - start
+
+    inner = 0.0
+    for name in names:
+        spent = stages.get(name, {'seconds': 0.0})['seconds'] - before[name]
+        record(results, dataset, name, nrows, spent)
+        inner += spent
+    record(results, dataset, rest, nrows, seconds - inner)
+    return value
+
+def read_text(fname):
+    with open(fname, 'r') as file:
+        csv_reader = csv.reader(file)
+        header = next(csv_reader)
+        next(csv_reader)
+        return pubdata.text_columns(csv_reader, header)
+
+def resolve_affiliations(columns):
+    # every affiliation string in the exports, with the resolver's caches emptied first so
+    # the time includes cleaning (and fuzzy matching) each distinct one; read_papers then
+    # finds them cached
+    resolver.resolve.cache_clear()
+    resolver.nearest.cache_clear()
+    return resolver.encode([affiliation for export in columns
+                            for affils in export['affiliations'] for affiliation in affils.split(';')])
+
+def group_figures(cells):
+    # UVA vs. peers mean score for each area, like the pubtrends 'group' graphs
+    figures = []
+    peerrows = [universities.index(univ) for univ in peers]
+    for (a, area) in enumerate(pubdata.areas):
+        fig = render.Figure(figsize=(10, 6))
+        fig.plot(pubdata.years, cells['mean_score'][a, universities.index('University of Virginia')],
+                 label='UVA', marker='o', linewidth=4, color=ucolor['University of Virginia'])
+        fig.plot(pubdata.years, cells['mean_score'][a, peerrows].mean(axis=0),
+                 label='Peers', marker='o', linewidth=4, alpha=0.8, color=ucolor['peers'])
+        fig.xlabel('Year', fontsize=32)
+        fig.ylabel('Mean Topic Score', fontsize=32)
+        fig.tight_layout()
+        figures.append(fig)
+    return figures
+
+def conference_figures(counts):
+    # UVA vs. peers papers per year at each conference, like the scopus graphs
+    figures = []
+    for conf in counts.confindex:
+        fig = render.Figure(figsize=(10, 6))
+        fig.plot(list(scopusdata.allyears), counts.papers('University of Virginia', conf),
+                 label='UVA', marker='o', linewidth=4, color=ucolor['University of Virginia'])
+        fig.plot(list(scopusdata.allyears), np.mean([counts.papers(univ, conf) for univ in uvapeers], axis=0),
+                 label='Peers', marker='o', linewidth=4, alpha=0.8, color=ucolor['peers'])
+        fig.xlabel('Year', fontsize=32)
+        fig.ylabel('Papers', fontsize=32)
+        fig.tight_layout()
+        figures.append(fig)
+    return figures
+
+def draw_all(figures, dirname):
+    for (i, fig) in enumerate(figures):
+        fig.savefig(os.path.join(dirname, 'bench-%d.pdf' % i))
+    render.draw_figures(figures, workers=1)
+
+def university_codes_cold(univcol):
+    # a new resolver, so the time includes cleaning (and fuzzy matching) every distinct string
+    return pubdata.university_codes(univcol, AffiliationResolver(fuzzy=resolver.fuzzy))
+
+def bench_pubs(dirname, nrows, streamrows):
+    fname = pubs_file(dirname, nrows)
+    if not os.path.exists(fname):
+        write_pubs(fname, nrows)
+
+    results = []
+    if nrows > streamrows:
+        # the stream resolves with the module's resolver, which is still cold in this
+        # fresh process
+        cells = timed_stages(results, 'pubs', ['parse', 'resolve', 'convert'], 'aggregate', nrows,
+                             pubdata.stream_aggregates, fname)
+    else:
+        text = timed(results, 'pubs', 'parse', nrows, read_text, fname)
+        univ = timed(results, 'pubs', 'resolve', nrows, university_codes_cold, text[1])
+        columns = timed(results, 'pubs', 'convert', nrows, pubdata.typed_columns, text, univ)
+        del text
+        cells = timed(results, 'pubs', 'aggregate', nrows, pubdata.aggregate, columns)
+        timed(results, 'pubs', 'thresholds', nrows, pubdata.threshold_counts, columns)
+    figures = group_figures(cells)
+    timed(results, 'pubs', 'render %d' % len(figures), None, draw_all, figures, dirname)
+    return results
+
+def bench_scopus(dirname, nrows):
+    files = scopus_files(dirname, nrows)
+    for (seed, (fname, conf)) in enumerate(files):
+        if not os.path.exists(fname):
+            write_scopus(fname, conf, nrows, seed)
+
+    results = []
+    columns = [timed(results, 'scopus', 'parse ' + conf, nrows, scopusdata.read_export, fname)
+               for (fname, conf) in files]
+    timed(results, 'scopus', 'resolve', nrows * len(files), resolve_affiliations, columns)
+    parts = [timed(results, 'scopus', 'index ' + conf, nrows, scopusdata.read_papers, fname, conf, export)
+             for ((fname, conf), export) in zip(files, columns)]
+    del columns
+    merged = timed(results, 'scopus', 'merge', nrows * len(files), scopusdata.merge_papers, parts)
+    del parts
+    counts = timed(results, 'scopus', 'aggregate', nrows * len(files), scopusdata.PlaceCounts.from_papers,
+                   *merged[:3])
+    figures = conference_figures(counts)
+    timed(results, 'scopus', 'render %d' % len(figures), None, draw_all, figures, dirname)
+    return results
+
+def run_size(dirname, nrows, which, streamrows):
+    results = []
+    if 'pubs' in which:
+        results += bench_pubs(dirname, nrows, streamrows)
+    if 'scopus' in which:
+        results += bench_scopus(dirname, nrows)
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark on synthetic data.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help='dataset sizes (rows per file)')
+    parser.add_argument('--dir', default='bench', help='where to keep the synthetic files')
+    parser.add_argument('--only', choices=['pubs', 'scopus'], help='run just one dataset')
+    parser.add_argument('--stream-rows', type=int, default=5000000,
+                        help='read scores files larger than this in chunks')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    which = [args.only] if args.only else ['pubs', 'scopus']
+
+    results = []
+    for nrows in args.rows:
+        # fresh process per size, so peak memory is per size
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            results += pool.submit(run_size, args.dir, nrows, which, args.stream_rows).result()
+
+    # the render stages are named with the number of figures, and have no rows
+    print("%-8s %-14s %10s %10s %14s %10s" % ('dataset', 'stage', 'rows', 'seconds', 'rows/sec', 'peak MB'))
+    for r in results:
+        print("%-8s %-14s %10s %10.3f %14s %10.1f" % (r['dataset'], r['stage'], r['rows'] or '-', r['seconds'],
+                                                    '%.0f' % r['rows_per_sec'] if r['rows_per_sec'] else '-',
+                                                    r['peak_rss_mb']))
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=1)
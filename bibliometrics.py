@@ -0,0 +1,149 @@
+###
+### bibliometrics.py
+###
+### Command line for the analyses:
+###
+###    python bibliometrics.py ingest [pubs|scopus]      parse the data (and cache it)
+###    python bibliometrics.py aggregate [pubs|scopus]   compute the aggregates
+###    python bibliometrics.py report [pubs|scopus]      print the per-university summary
+###    python bibliometrics.py plot [pubs|scopus]        draw the figures
+###    python bibliometrics.py partners [scopus]         top collaborators of UVA and its peers
+###    python bibliometrics.py query [pubs|scopus] --sql "SELECT ..."
+###                                                      query the SQLite store (see store.py)
+###
+### Modules are imported only by the commands that need them, and matplotlib only
+### when figures are actually drawn, so the numbers-only commands start quickly.
+###
+
+import argparse
+import time
+
+def pubs_data(args):
+    import pubtrends
+    return pubtrends.load_data(args.mode)
+
+def scopus_counts(args):
+    import scopus
+
+    if args.workers is not None:
+        scopus.ingestworkers = args.workers
+    return scopus.load_counts(args.mode if args.mode in ['stream', 'store'] else 'papers')
+
+def ingest(args):
+    if args.mode == 'store':
+        import store
+        store.open_store([args.dataset], workers=args.workers)
+    elif args.mode == 'stream':
+        # nothing is kept in stream mode, so this just reads the data through, in bounded
+        # memory, as the other commands would
+        if args.dataset == 'pubs':
+            import pubdata
+            data = pubs_data(args)
+            print("Papers: %d" % (sum(data[pubdata.areas[0]][univ][year]['count']
+                                      for univ in pubdata.universities for year in pubdata.years)))
+        else:
+            print("Papers: %d" % (scopus_counts(args).papers('all').sum()))
+    elif args.dataset == 'pubs':
+        import pubdata
+        if args.mode == 'append':
+            pubdata.update_aggregates(pubdata.datafile)
+        else:
+            columns = pubdata.load_columns(pubdata.datafile)
+            print("Papers: %d" % (len(columns['year'])))
+    else:
+        import scopus
+        if args.workers is not None:
+            scopus.ingestworkers = args.workers
+        scopus.load_papers()
+
+def aggregate(args):
+    if args.dataset == 'pubs':
+        import pubdata
+        data = pubs_data(args)
+        for area in pubdata.areas:
+            print("%s: %d papers" % (area, sum(data[area][univ][year]['count']
+                                                for univ in pubdata.universities
+                                                for year in pubdata.years)))
+    else:
+        counts = scopus_counts(args)
+        for conf in sorted(counts.confindex):
+            print("%s: %d papers, %d citings" % (conf, counts.papers('all', conf).sum(),
+                                                 counts.citings('all', conf).sum()))
+
+def report(args):
+    if args.dataset == 'pubs':
+        import pubtrends
+        pubtrends.print_summary(pubs_data(args))
+    else:
+        import scopus
+        scopus.print_summary(scopus_counts(args))
+
+def plot(args):
+    from render import render_figures
+    from instrument import stage
+
+    if args.dataset == 'pubs':
+        import pubtrends
+        bands = pubtrends.load_bands(args.bands) if args.bands else None
+        figures = pubtrends.make_figures(pubs_data(args), bands)
+    else:
+        import scopus
+        figures = scopus.make_figures(scopus_counts(args))
+
+    with stage('render'):
+        render_figures(figures, args.workers)
+
+def partners(args):
+    import scopus
+    from scopusdata import CoAffiliations
+    from instrument import stage
+
+    if args.workers is not None:
+        scopus.ingestworkers = args.workers
+    (papers, conferences, papersbyplace, affiliations) = scopus.load_papers()
+    with stage('coaffiliations'):
+        coaffiliations = CoAffiliations.from_papers(papers, conferences, papersbyplace)
+    scopus.print_partners(coaffiliations)
+
+def query(args):
+    import store
+
+    (columns, rows) = store.query(store.open_store([args.dataset], workers=args.workers), args.sql)
+    print('\t'.join(columns))
+    for row in rows:
+        print('\t'.join(str(value) for value in row))
+
+commands = {'ingest': ingest, 'aggregate': aggregate, 'report': report, 'plot': plot,
+            'partners': partners, 'query': query}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bibliometrics for the UVA AI Research Task Force report.')
+    parser.add_argument('command', choices=list(commands))
+    parser.add_argument('dataset', nargs='?', choices=['pubs', 'scopus'], default=None,
+                        help='OpenAlex publication scores (pubs, the default) or scopus conference '
+                             'papers (the default for partners)')
+    parser.add_argument('--mode', choices=['columnar', 'append', 'stream', 'store', 'rows'], default='columnar',
+                        help='how to read the data (see pubtrends.py; for scopus, only stream and store differ)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes for reading scopus files and drawing figures (default: one per CPU)')
+    parser.add_argument('--profile', action='store_true', help='write a JSON profile of the run')
+    parser.add_argument('--sql', help='the query for the query command')
+    parser.add_argument('--bands', type=int, default=None, metavar='RESAMPLES',
+                        help='draw bootstrap confidence bands with this many resamples on the pubs group graphs')
+    args = parser.parse_args()
+    if args.dataset is None:
+        args.dataset = 'scopus' if args.command == 'partners' else 'pubs'
+    if args.command == 'partners' and args.dataset != 'scopus':
+        parser.error("partners is only for the scopus data")
+    if args.command == 'query' and not args.sql:
+        parser.error("query needs --sql")
+    if args.bands and args.mode == 'stream':
+        parser.error("--bands resamples the papers, so it needs them in memory: use another --mode")
+
+    start = time.perf_counter()
+    commands[args.command](args)
+    print("%s %s: %.2f seconds" % (args.command, args.dataset, time.perf_counter() - start))
+
+    if args.profile:
+        from instrument import write_profile
+        write_profile(args.command + '-' + args.dataset)
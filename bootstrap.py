@@ -0,0 +1,140 @@
+###
+### bootstrap.py
+###
+### Bootstrap confidence bands for the group graphs: the mean topic score and the
+### threshold counts of each university, the group averages (as plotted for 'peers'),
+### and the gap between UVA and the peers.
+###
+### Papers are resampled with replacement within each (area, university, year).  The
+### scores are binned first (bins of 1/nbins, with t1 and t2 on bin edges), so a
+### resample is a multinomial draw of the bin counts, drawn as one binomial per bin for
+### every cell and resample at once.  The threshold counts are then exact bootstrap
+### counts.  For the mean, each drawn bin contributes its papers' mean score, plus
+### normal noise with the variance of the scores within the bin, so the spread is right
+### with a few wide bins.  The cost depends on the numbers of cells, bins and resamples,
+### not on the number of papers, and areas are resampled on a pool of processes.
+###
+
+import numpy as np
+
+import pubdata
+from universities import *
+from render import run_pool
+
+bandprops = ['mean_score', 'num_above_t1', 'num_above_t2']
+
+def binned_scores(columns, nbins):
+    """
+    Number of papers, total score and total squared score in each score bin, as areas x
+    universities x years x bins arrays.
+    """
+
+    nunivs = len(universities)
+    nyears = len(pubdata.years)
+    edges = np.arange(nbins + 1) / nbins
+    cell = pubdata.cell_index(columns)
+
+    counts = np.zeros((len(pubdata.areas), nunivs, nyears, nbins), dtype=np.int64)
+    totals = np.zeros((len(pubdata.areas), nunivs, nyears, nbins))
+    squares = np.zeros_like(totals)
+    for i in range(len(pubdata.areas)):
+        score = columns['scores'][:, i]
+        # as in pubdata.ScoreHistograms, so bins agree exactly with score >= edge
+        scorebin = np.minimum(np.searchsorted(edges, score, side='right') - 1, nbins - 1)
+        index = cell * nbins + scorebin
+        counts[i] = np.bincount(index, minlength=nunivs * nyears * nbins).reshape(nunivs, nyears, nbins)
+        totals[i] = np.bincount(index, weights=score, minlength=nunivs * nyears * nbins).reshape(nunivs, nyears, nbins)
+        squares[i] = np.bincount(index, weights=score * score, minlength=nunivs * nyears * nbins).reshape(nunivs, nyears, nbins)
+
+    return counts, totals, squares
+
+def resample_area(counts, totals, squares, nresamples, k1, k2, seed):
+    """
+    The bootstrap mean score and numbers of papers in bins >= k1 and >= k2, as resamples
+    x universities x years arrays, for one area's bin counts, totals and squares.
+    """
+
+    rng = np.random.default_rng(seed)
+    n = counts.sum(axis=-1)
+    binmean = np.divide(totals, counts, out=np.zeros(totals.shape), where=counts > 0)
+    binvar = np.maximum(np.divide(squares, counts, out=np.zeros(totals.shape), where=counts > 0) - binmean ** 2, 0)
+
+    total = np.zeros((nresamples,) + n.shape)
+    variance = np.zeros_like(total)
+    above1 = np.zeros((nresamples,) + n.shape)
+    above2 = np.zeros((nresamples,) + n.shape)
+
+    # multinomial draw of every cell's bin counts for all the resamples at once: each
+    # bin's count is binomial given the papers not yet assigned to the bins before it
+    left = np.broadcast_to(n, total.shape).copy()
+    rest = n.copy()
+    for k in range(counts.shape[-1]):
+        if not counts[..., k].any():
+            continue
+        p = np.divide(counts[..., k], rest, out=np.zeros(n.shape), where=rest > 0)
+        drawn = rng.binomial(left, np.minimum(p, 1.0))
+        left -= drawn
+        rest = rest - counts[..., k]
+
+        total += drawn * binmean[..., k]
+        variance += drawn * binvar[..., k]
+        if k >= k1:
+            above1 += drawn
+        if k >= k2:
+            above2 += drawn
+
+    total += rng.standard_normal(total.shape) * np.sqrt(variance)
+    mean = np.divide(total, n, out=np.zeros(total.shape), where=n > 0)
+    return {'mean_score': mean, 'num_above_t1': above1, 'num_above_t2': above2}
+
+def area_bands(counts, totals, squares, nresamples, level, k1, k2, member, gap, seed):
+    """
+    (low, high) quantiles over the resamples for one area, as 2 x rows x years arrays for
+    each of bandprops, where the rows are the universities, then the groups in member
+    (the averages over their universities), then the gap (gap[0] university minus
+    gap[1] group average).
+    """
+
+    stats = resample_area(counts, totals, squares, nresamples, k1, k2, seed)
+    quantiles = [(1 - level) / 2, (1 + level) / 2]
+
+    bands = {}
+    for prop in bandprops:
+        stat = stats[prop]
+        averages = np.matmul(member.T, stat) / member.sum(axis=0)[:, None]
+        difference = stat[:, gap[0]] - averages[:, gap[1]]
+        rows = np.concatenate([stat, averages, difference[:, None]], axis=1)
+        bands[prop] = np.quantile(rows, quantiles, axis=0)
+    return bands
+
+def confidence_bands(columns, nresamples=1000, level=0.95, t1=pubdata.t1, t2=pubdata.t2,
+                     nbins=8, groups=groups, gap=('University of Virginia', 'peers'),
+                     workers=None, seed=0):
+    """
+    Bootstrap confidence bands from the columns of pubdata.load_columns, with nresamples
+    resamples.  Returns bands[prop][name], a 2 x areas x years array of the low and high
+    ends of the band, for each of bandprops and for name each university, each group
+    (the average over its universities, as in the group graphs), and 'gap' (gap[0]
+    minus the gap[1] average).  t1 and t2 must be multiples of 1/nbins.  Areas are
+    resampled on a pool of workers processes (None for one per CPU, 1 to run in this
+    process); the result depends only on seed.
+    """
+
+    (k1, k2) = (int(round(t1 * nbins)), int(round(t2 * nbins)))
+    assert np.isclose(k1, t1 * nbins) and np.isclose(k2, t2 * nbins), "thresholds must be on bin edges"
+
+    (counts, totals, squares) = binned_scores(columns, nbins)
+    member = membership(groups)
+    gapindex = (universities.index(gap[0]), list(groups).index(gap[1]))
+    seeds = np.random.SeedSequence(seed).spawn(len(pubdata.areas))
+
+    args = [(counts[a], totals[a], squares[a], nresamples, level, k1, k2, member, gapindex, seeds[a])
+            for a in range(len(pubdata.areas))]
+    perarea = run_pool(area_bands, args, workers)
+
+    names = universities + list(groups) + ['gap']
+    bands = {}
+    for prop in bandprops:
+        stacked = np.stack([area[prop] for area in perarea], axis=1)
+        bands[prop] = {name: stacked[:, :, r] for (r, name) in enumerate(names)}
+    return bands
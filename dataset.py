@@ -0,0 +1,113 @@
+###
+### dataset.py
+###
+### Query API over the loaded aggregates, for notebooks and other tools:
+###
+###    from dataset import Dataset
+###    ds = Dataset.load(scopus=True)
+###    ds.series('machine learning', ['University of Virginia', 'peers'], metric='num_above_t2')
+###    ds.conference_series('Duke University', 'ICLR', metric='citings')
+###
+### Loading goes through the column cache (pubdata.load_columns), and loaded datasets
+### are kept for the life of the process, so repeated loads and queries are cheap.
+###
+
+import numpy as np
+
+import pubdata
+import scopusdata
+from universities import *
+
+class Dataset:
+    """
+    The publication score aggregates (cells, from pubdata.aggregate) and/or the scopus
+    PlaceCounts, with queries returning NumPy arrays.
+    """
+
+    loaded = {}
+
+    def __init__(self, columns=None, cells=None, counts=None):
+        self.columns = columns
+        self.cells = cells
+        self.counts = counts
+
+    @classmethod
+    def load(cls, pubs=True, scopus=False, t1=pubdata.t1, t2=pubdata.t2, workers=None):
+        """
+        The Dataset with the publication scores (pubs) and/or the scopus papers (scopus),
+        reusing one already loaded in this process with the same arguments.
+        """
+
+        key = (pubs, scopus, t1, t2)
+        if key not in cls.loaded:
+            columns = cells = counts = None
+            if pubs:
+                columns = pubdata.load_columns(pubdata.datafile)
+                cells = pubdata.aggregate(columns, t1, t2)
+            if scopus:
+                (papers, conferences, papersbyplace, affiliations) = \
+                    scopusdata.read_datafiles(scopusdata.datafiles, workers)
+                counts = scopusdata.PlaceCounts.from_papers(papers, conferences, papersbyplace)
+            cls.loaded[key] = cls(columns, cells, counts)
+        return cls.loaded[key]
+
+    def series(self, area, univs, years=None, metric='mean_score', groups=groups):
+        """
+        metric (one of pubdata.properties) for area over years (default: all of
+        pubdata.years).  univs is one university, giving a 1-d array, or a list of them,
+        giving a universities x years array.  A name in groups (by default
+        universities.groups) gives the average over its universities, as in the group
+        graphs.
+        """
+
+        if isinstance(univs, str):
+            return self.series(area, [univs], years, metric, groups)[0]
+
+        table = self.cells[metric][pubdata.areas.index(area)]
+        cols = year_index(years, pubdata.startyear, len(pubdata.years))
+
+        # averages of all the groups at once
+        member = membership(groups)
+        averages = member.T @ table / member.sum(axis=0)[:, None]
+        groupindex = {group: g for (g, group) in enumerate(groups)}
+
+        rows = []
+        for univ in univs:
+            if univ in groupindex:
+                rows.append(averages[groupindex[univ]])
+            else:
+                rows.append(table[universities.index(univ)])
+        return np.array(rows)[:, cols]
+
+    def conference_series(self, place, conf=None, metric='papers', years=None):
+        """
+        metric for the scopus papers at place (a cleaned affiliation, or 'all') over
+        years (default: scopusdata.allyears), at conf or (None) all conferences:
+        'papers', 'citings', 'mean_citings' (per paper), or 'paper_share' /
+        'citing_share' (fraction of the conference's papers or citations).
+        """
+
+        cols = year_index(years, scopusdata.minyear, len(scopusdata.allyears))
+        papers = self.counts.papers(place, conf)[cols]
+        citings = self.counts.citings(place, conf)[cols]
+
+        if metric == 'papers':
+            return papers
+        if metric == 'citings':
+            return citings
+        if metric == 'mean_citings':
+            return np.divide(citings, papers, out=np.zeros(len(papers)), where=papers > 0)
+        if metric == 'paper_share':
+            total = self.counts.papers('all', conf)[cols]
+            return np.divide(papers, total, out=np.zeros(len(papers)), where=total > 0)
+        if metric == 'citing_share':
+            total = self.counts.citings('all', conf)[cols]
+            return np.divide(citings, total, out=np.zeros(len(citings)), where=total > 0)
+        raise ValueError("Unknown metric: " + metric)
+
+def year_index(years, firstyear, nyears):
+    if years is None:
+        return np.arange(nyears)
+    index = np.asarray(list(years)) - firstyear
+    assert ((index >= 0) & (index < nyears)).all(), "years out of range"
+    return index
@@ -0,0 +1,72 @@
+###
+### instrument.py
+###
+### Named stage timers, counters and peak memory for a run, written out as a JSON
+### profile at the end (see write_profile) so runs can be compared.
+###
+
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+started = time.time()
+
+# stages[name] = {'seconds': total time, 'calls': times entered, 'peak_rss_mb': peak so far
+# when it last finished}.  Stages may nest; each one's time includes its inner stages.
+stages = {}
+counters = {}
+
+def peak_rss():
+    """
+    Peak resident memory of this process so far, in MB.
+    """
+
+    # ru_maxrss is in KB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == 'darwin' else rss / (1 << 10)
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record = stages.setdefault(name, {'seconds': 0.0, 'calls': 0, 'peak_rss_mb': 0.0})
+        record['seconds'] += time.perf_counter() - start
+        record['calls'] += 1
+        record['peak_rss_mb'] = peak_rss()
+
+def count(name, n=1):
+    counters[name] = counters.get(name, 0) + int(n)
+
+def add_counts(counts):
+    """
+    Add in counts kept elsewhere, e.g., returned from a worker process.
+    """
+
+    for (name, n) in counts.items():
+        count(name, n)
+
+def profile():
+    return {'started': datetime.fromtimestamp(started).isoformat(timespec='seconds'),
+            'argv': sys.argv,
+            'seconds': time.time() - started,
+            'peak_rss_mb': peak_rss(),
+            'stages': stages,
+            'counters': counters}
+
+def write_profile(name, dirname='profiles'):
+    """
+    Write the profile to dirname/<name>-<start time>.json, and return the file name.
+    """
+
+    os.makedirs(dirname, exist_ok=True)
+    fname = os.path.join(dirname, '%s-%s.json' % (name, datetime.fromtimestamp(started).strftime('%Y%m%d-%H%M%S')))
+    with open(fname, 'w') as file:
+        json.dump(profile(), file, indent=1)
+    print("Wrote profile: " + fname)
+    return fname
@@ -0,0 +1,590 @@
+###
+### pubdata.py
+###
+### Columnar loading and aggregation of the OpenAlex publication data (with topic
+### scores assigned by model) used by pubtrends.py.
+###
+### Written for UVA AI Research Task Force report.
+###
+
+import csv
+import hashlib
+import json
+import locale
+import os
+from itertools import islice
+from operator import itemgetter
+
+import numpy as np
+
+from universities import *
+from instrument import stage, count
+
+datafile = 'data/publications.scores.mult.viz.csv'
+
+areas = [
+        'neural networks',
+        'artificial intelligence',
+        'quantitative methods',
+        'applied work',
+        'machine learning',
+        'natural language processing',
+        'data analysis',
+        'data mining',
+        'bioinformatics',
+        'statistics'
+    ]
+
+areaname = {
+        'neural networks': "Neural Networks",
+        'artificial intelligence': "Artificial Intelligence",
+        'quantitative methods': "Quantitative Methods",
+        'applied work': "Applied Work",
+        'machine learning': "Machine Learning",
+        'natural language processing': "NLP",
+        'data analysis': "Data Analysis",
+        'data mining': "Data Mining",
+        'bioinformatics': "Bioinformatics",
+        'statistics': "Statistics"
+}
+
+startyear = 1980
+endyear = 2023 # not enough data for 2024
+
+years = range(startyear, (endyear + 1))
+t1 = 0.25
+t2 = 0.75
+
+# thresholds 0.00, 0.01, ..., 1.00 for threshold_counts
+thresholdgrid = np.arange(101) / 100
+
+properties = ['count', 'total_score', 'num_above_t1', 'num_above_t2', 'mean_score']
+
+def read_columns(fname):
+    """
+    Read the publications CSV into NumPy columns.  Returns a dict with 'year' and 'univ'
+    (index into universities) arrays, and 'scores', a papers x areas matrix.
+
+    Follows the row-at-a-time reader: GMU rows are dropped, an unknown university is an
+    error, and papers outside [startyear, endyear] are skipped.
+    """
+
+    with open(fname, 'r') as file:
+        csv_reader = csv.reader(file)
+        header = next(csv_reader)
+        next(csv_reader)
+
+        print("Reading CSV file...")
+        columns = parse_rows(csv_reader, header)
+
+    print("Finished reading CSV file")
+    return columns
+
+def parse_rows(csv_reader, header):
+    """
+    Convert the rows from csv_reader (for a file with the given header) into columns,
+    as described for read_columns.
+    """
+
+    with stage('parse'):
+        text = text_columns(csv_reader, header)
+    if not text:
+        return empty_columns()
+    count('rows read', len(text[0]))
+
+    with stage('resolve'):
+        univ = university_codes(text[1])
+    with stage('convert'):
+        return typed_columns(text, univ)
+
+def empty_columns():
+    return {'year': np.zeros(0, dtype=np.int64),
+            'univ': np.zeros(0, dtype=np.int64),
+            'scores': np.zeros((0, len(areas)))}
+
+def text_columns(csv_reader, header):
+    """
+    The Year, University and area score columns of the rows, as tuples of strings.
+    """
+
+    header_dict = {col: index for index, col in enumerate(header)}
+    for area in areas:
+        assert area in header_dict
+
+    getcols = itemgetter(header_dict['Year'], header_dict['University'],
+                         *[header_dict[area] for area in areas])
+
+    # transpose into one tuple of strings per column, without a Python loop per row
+    return list(zip(*map(getcols, csv_reader)))
+
+def university_codes(univcol, resolver=resolver):
+    """
+    Index into universities for each raw University string, len(universities) for GMU.
+    """
+
+    before = resolver.resolve.cache_info()
+    univ, names = resolver.encode(univcol, universities + ['George Mason University'])
+    after = resolver.resolve.cache_info()
+    count('resolver cache hits', after.hits - before.hits)
+    count('resolver cache misses', after.misses - before.misses)
+
+    if (univ < 0).any():
+        print("Unknown univ: " + str(resolver.resolve(univcol[int(np.argmax(univ < 0))])))
+        assert False
+    return univ
+
+def typed_columns(text, univ):
+    """
+    Columns from the text_columns and their university codes, dropping GMU and the
+    years out of range.
+    """
+
+    year = np.array(text[0], dtype=np.int64)
+
+    # GMU is included in the pubtrends data, but is not in the list of peers
+    inrange = (year >= startyear) & (year <= endyear)
+    keep = (univ < len(universities)) & inrange
+    count('rows skipped (year)', (~inrange).sum())
+    count('rows skipped (GMU)', (inrange & ~keep).sum())
+
+    scores = np.empty((int(keep.sum()), len(areas)))
+    for i in range(len(areas)):
+        scores[:, i] = np.array(text[2 + i], dtype=np.float64)[keep]
+    assert ((scores >= 0.0) & (scores <= 1.0)).all()
+
+    return {'year': year[keep], 'univ': univ[keep], 'scores': scores}
+
+def aggregate(columns, t1=t1, t2=t2):
+    """
+    Reduce the columns from read_columns into areas x universities x years arrays for each
+    of the properties, using one bincount per area and property.
+    """
+
+    nunivs = len(universities)
+    nyears = len(years)
+    cell = cell_index(columns)
+    ncells = nunivs * nyears
+
+    count = np.bincount(cell, minlength=ncells).reshape(nunivs, nyears)
+    cells = {prop: np.zeros((len(areas), nunivs, nyears)) for prop in properties}
+
+    for i in range(len(areas)):
+        score = columns['scores'][:, i]
+        cells['count'][i] = count
+        cells['total_score'][i] = np.bincount(cell, weights=score, minlength=ncells).reshape(nunivs, nyears)
+        cells['num_above_t1'][i] = np.bincount(cell[score >= t1], minlength=ncells).reshape(nunivs, nyears)
+        cells['num_above_t2'][i] = np.bincount(cell[score >= t2], minlength=ncells).reshape(nunivs, nyears)
+
+    return set_means(cells)
+
+def cell_index(columns):
+    """
+    Flat (university, year) cell number of each paper in columns.
+    """
+
+    return columns['univ'] * len(years) + (columns['year'] - startyear)
+
+def threshold_counts(columns, thresholds=thresholdgrid):
+    """
+    Number of papers with score >= t for each of the thresholds, for every (area,
+    university, year), in one pass over each area's scores: papers are binned by how
+    many of the (sorted) thresholds they reach, and reverse cumulative sums of the bins
+    give the counts.  Returns an areas x universities x years x thresholds array, with
+    the thresholds in the order given.
+    """
+
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    order = np.argsort(thresholds)
+    ordered = thresholds[order]
+    nthresholds = len(ordered)
+
+    nunivs = len(universities)
+    nyears = len(years)
+    cell = cell_index(columns) * (nthresholds + 1)
+    nbins = nunivs * nyears * (nthresholds + 1)
+
+    counts = np.zeros((len(areas), nunivs, nyears, nthresholds), dtype=np.int64)
+    for i in range(len(areas)):
+        reached = np.searchsorted(ordered, columns['scores'][:, i], side='right')
+        bins = np.bincount(cell + reached, minlength=nbins).reshape(nunivs, nyears, nthresholds + 1)
+        # score >= ordered[j] exactly when the paper reached more than j thresholds
+        atleast = np.cumsum(bins[..., ::-1], axis=-1)[..., ::-1]
+        counts[i][..., order] = atleast[..., 1:]
+
+    return counts
+
+def set_means(cells):
+    """
+    Fill in cells['mean_score'] from the totals and counts (0 for cells with no papers).
+    """
+
+    cells['mean_score'] = np.zeros_like(cells['total_score'])
+    np.divide(cells['total_score'], cells['count'], out=cells['mean_score'], where=cells['count'] > 0)
+    return cells
+
+def group_cells(cells, groups=groups):
+    """
+    The rollups of the per-university cells for each of groups, as areas x groups x years
+    arrays for each property, from one product of the membership matrix with all of the
+    cells.  As in the original report, every property is the sum over the group's
+    universities, including mean_score (the sum of their means; plots divide by the
+    group size).
+    """
+
+    stacked = np.stack([cells[prop] for prop in properties])
+    sums = np.matmul(membership(groups).T, stacked)
+    return {prop: sums[i] for (i, prop) in enumerate(properties)}
+
+def cells_to_data(cells, groups=groups):
+    """
+    Convert aggregate arrays into the data[area][univ][year][property] dicts used by the
+    plotting code, including a rollup (see group_cells) for each of groups.
+    """
+
+    rollups = group_cells(cells, groups)
+
+    data = {}
+    for a, area in enumerate(areas):
+        data[area] = {}
+        rows = {}
+        for u, univ in enumerate(universities):
+            rows[univ] = {prop: cells[prop][a, u].tolist() for prop in properties}
+        for (g, group) in enumerate(groups):
+            rows[group] = {prop: rollups[prop][a, g].tolist() for prop in properties}
+
+        for univ in rows:
+            data[area][univ] = {}
+            for y, year in enumerate(years):
+                dobj = {prop: rows[univ][prop][y] for prop in properties}
+                for prop in ['count', 'num_above_t1', 'num_above_t2']:
+                    dobj[prop] = int(dobj[prop])
+                data[area][univ][year] = dobj
+
+    return data
+
+# about how many bytes each row takes while a chunk is being parsed (mostly the strings
+# from the csv reader), for sizing chunks to a memory limit
+rowbytes = 1200
+
+def stream_aggregates(fname=datafile, t1=t1, t2=t2, maxmemory=512, chunkrows=None):
+    """
+    Same result as aggregate(read_columns(fname), t1, t2), but reading fname in chunks
+    of chunkrows rows (by default, as many as fit in about maxmemory MB), adding each
+    chunk's aggregates into the totals and dropping its rows before reading the next.
+    Memory use does not grow with the size of the file.
+    """
+
+    if chunkrows is None:
+        chunkrows = max(1000, maxmemory * (1 << 20) // rowbytes)
+
+    totals = {prop: np.zeros((len(areas), len(universities), len(years))) for prop in properties}
+    with open(fname, 'r') as file:
+        csv_reader = csv.reader(file)
+        header = next(csv_reader)
+        next(csv_reader)
+
+        print("Reading CSV file in chunks of %d rows..." % (chunkrows))
+        while True:
+            with stage('parse'):
+                text = text_columns(islice(csv_reader, chunkrows), header)
+            if not text:
+                break
+            count('rows read', len(text[0]))
+            count('chunks')
+
+            with stage('resolve'):
+                univ = university_codes(text[1])
+            with stage('convert'):
+                columns = typed_columns(text, univ)
+            del text
+
+            cells = aggregate(columns, t1, t2)
+            for prop in properties:
+                if prop != 'mean_score':
+                    totals[prop] += cells[prop]
+
+    print("Finished reading CSV file")
+    return set_means(totals)
+
+def file_hash(fname):
+    """
+    SHA-1 of the contents of fname, read in 1MB blocks.
+    """
+
+    h = hashlib.sha1()
+    with open(fname, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def cache_key(fname):
+    """
+    What the parsed columns depend on: the source file and the settings read_columns uses,
+    including how affiliations resolve.
+    """
+
+    st = os.stat(fname)
+    return {'size': st.st_size, 'mtime': st.st_mtime_ns,
+            'areas': areas, 'universities': universities,
+            'startyear': startyear, 'endyear': endyear, 'resolver': resolver.fingerprint()}
+
+def load_columns(fname=datafile, usecache=True):
+    """
+    Same result as read_columns(fname), but the parsed columns are kept as .npy files in
+    fname + '.cache' and memory-mapped on later runs.  The cache is used when the source
+    size and mtime match; if only the mtime changed (e.g., the file was copied), the
+    contents hash decides.
+    """
+
+    cachedir = fname + '.cache'
+    metafile = os.path.join(cachedir, 'meta.json')
+    key = cache_key(fname)
+
+    if usecache and os.path.exists(metafile):
+        with open(metafile, 'r') as file:
+            meta = json.load(file)
+        stored = meta['key']
+        if all(stored.get(k) == key[k] for k in key if k != 'mtime'):
+            fresh = stored['mtime'] == key['mtime']
+            if not fresh and file_hash(fname) == meta['hash']:
+                fresh = True
+                meta['key'] = key
+                with open(metafile, 'w') as file:
+                    json.dump(meta, file)
+            if fresh:
+                print("Using cached columns: " + cachedir)
+                count('column cache hits')
+                return {col: np.load(os.path.join(cachedir, col + '.npy'), mmap_mode='r')
+                        for col in ['year', 'univ', 'scores']}
+
+    columns = read_columns(fname)
+
+    if usecache:
+        os.makedirs(cachedir, exist_ok=True)
+        if os.path.exists(metafile):
+            os.remove(metafile)
+        for col in columns:
+            np.save(os.path.join(cachedir, col + '.npy'), columns[col])
+        # meta.json is written last, so a partly written cache is never used
+        with open(metafile, 'w') as file:
+            json.dump({'key': key, 'hash': file_hash(fname)}, file)
+        print("Wrote column cache: " + cachedir)
+
+    return columns
+
+def watermark_sample(file, offset):
+    # the header line and the block just before offset, to notice a file that was
+    # rewritten rather than appended to (without rehashing everything already read)
+    file.seek(0)
+    h = hashlib.sha1(file.readline())
+    file.seek(max(0, offset - (1 << 16)))
+    h.update(file.read(offset - file.tell()))
+    return h.hexdigest()
+
+def complete_end(bfile, size):
+    """
+    Byte offset just past the last newline in the first size bytes of bfile (0 if there
+    is none), i.e. the end of the last complete line.
+    """
+
+    end = size
+    while end > 0:
+        start = max(0, end - (1 << 16))
+        bfile.seek(start)
+        newline = bfile.read(end - start).rfind(b'\n')
+        if newline >= 0:
+            return start + newline + 1
+        end = start
+    return 0
+
+def bounded_lines(bfile, end, encoding):
+    """
+    The lines of bfile from its current position up to byte offset end (on a line
+    boundary), decoded.
+    """
+
+    pos = bfile.tell()
+    for line in bfile:
+        pos += len(line)
+        if pos > end:
+            break
+        yield line.decode(encoding)
+
+def update_aggregates(fname=datafile, t1=t1, t2=t2):
+    """
+    Same result as aggregate(read_columns(fname), t1, t2), for a CSV that only grows by
+    appending rows.  The aggregates are saved in fname + '.aggregates.npz' along with the
+    byte offset read up to, and later calls parse only the rows after that offset and
+    add them in.  (The group rollups are computed from these per-university cells, so
+    they need no state of their own.)  Only complete lines are read: a partly written
+    last row, and anything appended while reading, is left for the next call.  Starts
+    over if the settings changed or the file does not look like an append to what was
+    read before.
+    """
+
+    statefile = fname + '.aggregates.npz'
+    settings = {'areas': areas, 'universities': universities, 'resolver': resolver.fingerprint(),
+                'startyear': startyear, 'endyear': endyear, 't1': t1, 't2': t2}
+    encoding = locale.getpreferredencoding(False)
+
+    with open(fname, 'rb') as bfile:
+        size = os.fstat(bfile.fileno()).st_size
+        end = complete_end(bfile, size)
+
+        cells = None
+        offset = 0
+        if os.path.exists(statefile):
+            with np.load(statefile) as state:
+                meta = json.loads(str(state['meta']))
+                if meta['settings'] == settings and meta['offset'] <= end \
+                   and watermark_sample(bfile, meta['offset']) == meta['sample']:
+                    cells = {prop: state[prop] for prop in properties if prop != 'mean_score'}
+                    offset = meta['offset']
+                else:
+                    print("Saved aggregates do not match " + fname + ", starting over")
+
+        bfile.seek(0)
+        header = next(csv.reader(bounded_lines(bfile, end, encoding)), None)
+        if cells is None:
+            # skip the line after the header, as read_columns does
+            bfile.seek(0)
+            bfile.readline()
+            bfile.readline()
+            offset = min(bfile.tell(), end)
+        bfile.seek(offset)
+        csv_reader = csv.reader(bounded_lines(bfile, end, encoding))
+
+        print("Reading CSV file from byte %d of %d..." % (offset, end))
+        # (no complete header line yet means no rows yet)
+        columns = empty_columns() if header is None else parse_rows(csv_reader, header)
+        delta = aggregate(columns, t1, t2)
+        print("Finished reading CSV file")
+
+        sample = watermark_sample(bfile, end)
+
+    if cells is not None:
+        for prop in cells:
+            delta[prop] += cells[prop]
+        set_means(delta)
+
+    meta = {'settings': settings, 'offset': end, 'sample': sample}
+    np.savez(statefile, meta=np.array(json.dumps(meta)),
+             **{prop: delta[prop] for prop in properties if prop != 'mean_score'})
+    return delta
+
+class ScoreHistograms:
+    """
+    Fixed-bin histograms of the topic scores for every (area, university, year), in an
+    areas x universities x years x bins array, plus the score totals for exact means.
+    Queries (mean, papers above a threshold, percentiles) are answered from these
+    without going back to the papers, for one university or pooled over several.
+    Histograms for disjoint sets of papers merge by adding.
+
+    Bin k < nbins covers [k/nbins, (k+1)/nbins), and one more bin holds the scores of
+    exactly 1.0.  Counts above a threshold on a bin edge (e.g. t1 and t2 with the
+    default 200 bins, or 1.0) are exact; otherwise they, and percentiles, interpolate
+    within a bin.
+    """
+
+    def __init__(self, counts, totals):
+        self.counts = counts
+        self.totals = totals
+        self.nbins = counts.shape[-1] - 1
+        self.edges = np.arange(self.nbins + 1) / self.nbins
+
+    @classmethod
+    def from_columns(cls, columns, nbins=200):
+        nunivs = len(universities)
+        nyears = len(years)
+        edges = np.arange(nbins + 1) / nbins
+        cell = cell_index(columns)
+
+        counts = np.zeros((len(areas), nunivs, nyears, nbins + 1), dtype=np.int64)
+        totals = np.zeros((len(areas), nunivs, nyears))
+        for i in range(len(areas)):
+            score = columns['scores'][:, i]
+            # searchsorted (rather than score * nbins) so bins agree exactly with
+            # score >= edge comparisons; 1.0 lands in bin nbins
+            scorebin = np.searchsorted(edges, score, side='right') - 1
+            counts[i] = np.bincount(cell * (nbins + 1) + scorebin,
+                                    minlength=nunivs * nyears * (nbins + 1)).reshape(nunivs, nyears, nbins + 1)
+            totals[i] = np.bincount(cell, weights=score, minlength=nunivs * nyears).reshape(nunivs, nyears)
+
+        return cls(counts, totals)
+
+    def merge(self, other):
+        """
+        Histograms for the papers in both self and other (e.g., an earlier and a newly
+        appended part of the data).
+        """
+
+        assert self.nbins == other.nbins
+        return ScoreHistograms(self.counts + other.counts, self.totals + other.totals)
+
+    def select(self, area, univs):
+        """
+        (years x bins counts, per-year totals) for area, pooled over univs, which is one
+        university name or a list of them.
+        """
+
+        a = areas.index(area)
+        if isinstance(univs, str):
+            u = universities.index(univs)
+            return self.counts[a, u], self.totals[a, u]
+        u = [universities.index(univ) for univ in univs]
+        return self.counts[a, u].sum(axis=0), self.totals[a, u].sum(axis=0)
+
+    def count(self, area, univs):
+        return self.select(area, univs)[0].sum(axis=-1)
+
+    def mean(self, area, univs):
+        """
+        Mean score per year (0 for years with no papers).
+        """
+
+        (counts, totals) = self.select(area, univs)
+        n = counts.sum(axis=-1)
+        return np.divide(totals, n, out=np.zeros(len(totals)), where=n > 0)
+
+    def count_above(self, area, univs, t):
+        """
+        Number of papers per year with score >= t.
+        """
+
+        (counts, totals) = self.select(area, univs)
+        k = int(np.searchsorted(self.edges, t, side='right')) - 1
+        if k < 0:
+            return counts.sum(axis=-1).astype(np.float64)
+        if t > 1.0:
+            return np.zeros(len(counts))
+        if k == self.nbins:
+            return counts[:, k].astype(np.float64)
+        above = counts[:, k + 1:].sum(axis=-1).astype(np.float64)
+        # the part of bin k above t, assuming scores are spread evenly within the bin
+        fraction = min(1.0, (self.edges[k + 1] - t) * self.nbins)
+        return above + fraction * counts[:, k]
+
+    def percentile(self, area, univs, q):
+        """
+        q-th percentile (0 <= q <= 100) of the scores per year (nan for years with no
+        papers), interpolating within the bin.
+        """
+
+        (counts, totals) = self.select(area, univs)
+        cum = np.cumsum(counts, axis=-1)
+        n = cum[:, -1]
+        target = q / 100 * n
+
+        # the first non-empty bin that reaches the target (so q = 0 gives the lowest bin
+        # with papers)
+        k = ((cum >= target[:, None]) & (counts > 0)).argmax(axis=-1)
+        rows = np.arange(len(k))
+        before = np.where(k > 0, cum[rows, k - 1], 0)
+        inbin = counts[rows, k]
+        fraction = np.divide(target - before, inbin, out=np.zeros(len(k)), where=inbin > 0)
+
+        # the bin of exact 1.0 scores has no width
+        width = np.where(k < self.nbins, 1 / self.nbins, 0)
+        result = self.edges[k] + fraction * width
+        result[n == 0] = np.nan
+        return result
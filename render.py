@@ -0,0 +1,178 @@
+###
+### render.py
+###
+### Figures for pubtrends.py and scopus.py are described as Figure objects (the
+### series data and the pyplot calls that style them) and drawn afterwards, on a
+### process pool when there is more than one to draw.  A figure whose description
+### has not changed since its file was last written is not drawn again.
+###
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+def pyplot():
+    """
+    Import pyplot with the non-interactive backend (only when a figure is actually drawn).
+    """
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+def plain(value):
+    # arrays and ranges become lists, so figures pickle (and compare) as plain data
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (range, list)):
+        return [plain(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+class Figure:
+    """
+    Records the pyplot calls for one figure, in order, so it can be drawn later by
+    draw().  Use transform='axes' for text positioned in axes coordinates.
+    """
+
+    def __init__(self, figsize=(10, 6), rcparams=None):
+        self.figsize = figsize
+        self.rcparams = dict(rcparams or {})
+        self.calls = []
+        self.file = None
+
+    def record(self, name, args, kwargs):
+        self.calls.append((name, [plain(arg) for arg in args],
+                           {key: plain(value) for key, value in kwargs.items()}))
+
+    def plot(self, *args, **kwargs):
+        self.record('plot', args, kwargs)
+
+    def fill_between(self, *args, **kwargs):
+        self.record('fill_between', args, kwargs)
+
+    def text(self, *args, **kwargs):
+        self.record('text', args, kwargs)
+
+    def xlabel(self, *args, **kwargs):
+        self.record('xlabel', args, kwargs)
+
+    def ylabel(self, *args, **kwargs):
+        self.record('ylabel', args, kwargs)
+
+    def title(self, *args, **kwargs):
+        self.record('title', args, kwargs)
+
+    def legend(self, *args, **kwargs):
+        self.record('legend', args, kwargs)
+
+    def xticks(self, *args, **kwargs):
+        self.record('xticks', args, kwargs)
+
+    def yticks(self, *args, **kwargs):
+        self.record('yticks', args, kwargs)
+
+    def grid(self, *args, **kwargs):
+        self.record('grid', args, kwargs)
+
+    def tight_layout(self, *args, **kwargs):
+        self.record('tight_layout', args, kwargs)
+
+    def savefig(self, fname):
+        self.file = fname
+
+    def digest(self):
+        """
+        Hash of everything that determines how the figure looks: size, rc settings, and
+        each call with its data and style arguments (colors, font sizes, positions...).
+        """
+
+        spec = {'figsize': self.figsize, 'rcparams': self.rcparams, 'calls': self.calls}
+        return hashlib.sha1(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()
+
+def draw(fig):
+    """
+    Draw fig with pyplot and write it to fig.file.
+    """
+
+    plt = pyplot()
+    with plt.rc_context(fig.rcparams):
+        plt.figure(figsize=fig.figsize)
+        for (name, args, kwargs) in fig.calls:
+            if kwargs.get('transform') == 'axes':
+                kwargs = dict(kwargs, transform=plt.gca().transAxes)
+            getattr(plt, name)(*args, **kwargs)
+        plt.savefig(fig.file)
+        plt.close()
+    return fig.file
+
+hashfile = '.figurehashes.json'
+
+def read_hashes(dirname):
+    fname = os.path.join(dirname, hashfile)
+    if not os.path.exists(fname):
+        return {}
+    with open(fname, 'r') as file:
+        return json.load(file)
+
+def write_hashes(dirname, hashes):
+    with open(os.path.join(dirname, hashfile), 'w') as file:
+        json.dump(hashes, file, indent=1, sort_keys=True)
+
+def render_figures(figures, workers=None, usecache=True):
+    """
+    Draw all the figures, using a pool of worker processes (None for one per CPU).
+    With workers=1, or just one figure, they are drawn in this process.
+
+    Each output directory keeps the digest of every figure written there (in
+    .figurehashes.json).  With usecache, figures whose file exists with the same digest
+    are skipped; without it, all are drawn, and only their digests are updated.
+    """
+
+    hashes = {}
+    for fig in figures:
+        dirname = os.path.dirname(fig.file)
+        if dirname not in hashes:
+            hashes[dirname] = read_hashes(dirname)
+
+    todo = []
+    for fig in figures:
+        dirname = os.path.dirname(fig.file)
+        name = os.path.basename(fig.file)
+        if usecache and os.path.exists(fig.file) and hashes[dirname].get(name) == fig.digest():
+            continue
+        todo.append(fig)
+
+    print("Rendering %d of %d figures (others unchanged)" % (len(todo), len(figures)))
+    written = draw_figures(todo, workers)
+
+    for fig in todo:
+        hashes[os.path.dirname(fig.file)][os.path.basename(fig.file)] = fig.digest()
+    for dirname in hashes:
+        write_hashes(dirname, hashes[dirname])
+
+    return written
+
+def run_pool(fn, args, workers=None):
+    """
+    [fn(*arg) for arg in args], on a pool of worker processes (None for one per CPU, 1
+    to run them in this process), never more than there are args.
+    """
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(args))
+
+    if workers <= 1:
+        return [fn(*arg) for arg in args]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fn, *zip(*args)))
+
+def draw_figures(figures, workers=None):
+    return run_pool(draw, [(fig,) for fig in figures], workers)
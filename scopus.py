@@ -6,114 +6,29 @@
 ### Written for UVA AI Research Task Force report.
 ###
 
-from collections import namedtuple
 import time
 import re
-import csv
 
-import matplotlib.pyplot as plt
+import numpy as np
 from universities import *
+from scopusdata import *
+from render import *
+from instrument import stage, write_profile
 
-# Scopus queries to get the data:
-#
-# - CONFNAME ( "ICML" ) AND PUBYEAR > 2020 AND ( LIMIT-TO ( DOCTYPE , "cp" ) ) AND ( LIMIT-TO ( EXACTSRCTITLE , "Proceedings Of Machine Learning Research" ) )
-# - SRCTITLE ( "Advances in Neural Information Processing Systems" ) AND ( LIMIT-TO ( DOCTYPE , "cp" ) )
-# - SRCTITLE ( "International Conference on Learning Representations" ) AND ( LIMIT-TO ( EXACTSRCTITLE , "Iclr 2022 10th International Conference On Learning Representations" ) OR LIMIT-TO ( EXACTSRCTITLE , "Iclr 2021 9th International Conference On Learning Representations" ) OR LIMIT-TO ( EXACTSRCTITLE , "8th International Conference On Learning Representations Iclr 2020" ) OR LIMIT-TO ( EXACTSRCTITLE , "7th International Conference On Learning Representations Iclr 2019" ) OR LIMIT-TO ( EXACTSRCTITLE , "6th International Conference On Learning Representations Iclr 2018 Conference Track Proceedings" ) OR LIMIT-TO ( EXACTSRCTITLE , "5th International Conference On Learning Representations Iclr 2017 Conference Track Proceedings" ) OR LIMIT-TO ( EXACTSRCTITLE , "4th International Conference On Learning Representations Iclr 2016 Conference Track Proceedings" ) OR LIMIT-TO ( EXACTSRCTITLE , "2nd International Conference On Learning Representations Iclr 2014 Conference Track Proceedings" ) OR LIMIT-TO ( EXACTSRCTITLE , "3rd International Conference On Learning Representations Iclr 2015 Conference Track Proceedings" ) OR LIMIT-TO ( EXACTSRCTITLE , "1st International Conference On Learning Representations Iclr 2013 Conference Track Proceedings" ) )
-#      (Note: selected to avoid including workshops)
-
-datafiles = [
-    ("data/neurips-all-scopus.csv", "NeurIPS"),
-    ("data/AAAI-2007-2023-scopus.csv", "AAAI"),
-    ("data/ICML-1988-2020-scopus.csv", "ICML"),
-    ("data/ICML-2021-2023-scopus.csv", "ICML"),
-    ("data/iclr-all-scopus.csv", "ICLR"),
-]
-
-affiliations = {}
-papersbyplace = {}
-papersbyplace['all'] = {}
-
-conferences = {}
-
-# For the main graphs, used 2012-2022; for some of the conference graphs used 2000-2023.
-
-minyear = 2012
-maxyear = 2022
-
-# minyear = 2000
-# maxyear = 2023
-
-allyears = range(minyear, maxyear + 1)
-
-def read_papers(fname, conf):
-    papers = []
-    
-    if conf not in conferences:
-        conferences[conf] = {}
-        papersbyplace['all'][conf] = {}
-
-        for nyear in allyears:
-            conferences[conf][nyear] = set()
-            papersbyplace['all'][conf][nyear] = []
-
-    with open(fname, encoding='ISO-8859-1') as csvfile:
-        sreader = csv.reader(csvfile, delimiter=',', quotechar='"')
-        headers = next(sreader)
-        for row in sreader:
-           papers.append({key: value for key, value in zip(headers, row)})
-
-    print ("Read papers: " + str(len(papers)))
-    
-    for paper in papers:
-        if len(paper["Title"].strip()) < 2:
-            pass
-        if not paper["Affiliations"]:
-            pass # print("No Affiliations for paper: " + paper["Title"])
-
-        conference = paper["Conference name"]
-        year = int(paper["Year"]) # Conference date"][-4:])
-
-        if year < minyear or year > maxyear:
-            continue # skip papers out of year range
-
-        conferences[conf][year].add(conference)
-        paper['papersbyplace'] = set()
-        
-        papersbyplace['all'][conf][year].append(paper)
-
-        for affiliation in paper["Affiliations"].split(';'):
-            if affiliation in affiliations:
-                affiliations[affiliation].append(paper)
-            else:
-                affiliations[affiliation] = [paper]
-
-            affil = cleanAffiliation(affiliation)
-
-            if affil not in papersbyplace:
-                papersbyplace[affil] = {}
-
-            # there's gotta be a better way to do this...
-            if conf not in papersbyplace[affil]:
-                papersbyplace[affil][conf] = {}
-                for nyear in allyears:
-                    papersbyplace[affil][conf][nyear] = []
+# the datafiles are read on this many processes, and figures drawn at the end on this
+# many (None for one per CPU)
+ingestworkers = None
+renderworkers = None
 
-            # without this, counts number of paper-affiliations
-            if paper not in papersbyplace[affil][conf][year]: 
-                papersbyplace[affil][conf][year].append(paper)
+# 'papers' keeps every paper in memory (needed for anything beyond the counts); 'stream'
+# keeps only the paper and citation counts for each place, conference and year (and the
+# keys to drop duplicate papers by); 'store'
+# counts the papers kept in the SQLite store (see store.py).
+ingestmode = 'papers'
 
-            paper['papersbyplace'].add(affil)
-        
-    return papers
-
-papers = []
-confs = set()
-
-for (file, conf) in datafiles:
-    confs.add(conf)
-    papers += read_papers(file, conf)
+confs = set(conf for (file, conf) in datafiles)
 
-print("Papers: %d, Affiliations: %d, Cleaned: %d" % (len(papers), len(affiliations), len(papersbyplace)))
+rcparams = {'font.family': 'Times New Roman'} # Helvetica'
 
 confcolor = {
     'NeurIPS': '#118ab2',
@@ -122,96 +37,6 @@ confcolor = {
     'ICLR': '#ffd166'
 }
 
-if True: # generate Total Citings
-    years = allyears # [conferences[conference]['year'] for conference in conferences if conferences[conference]['name'] == cname]
-
-    for mean in [True, False]:
-        graphname = 'Average Citations per Paper' if mean else 'Total Citations'
-        plt.figure(figsize=(10, 6))    
-        plt.rcParams['font.family'] = 'Times New Roman' # Helvetica'        
-
-        basesize = 28
-
-        clist = list(confs)
-        clist.sort(key=lambda conf: sum([int(paper['Cited by']) 
-                                        for paper in papersbyplace['all'][conf][maxyear]]), 
-                    reverse=True)
-
-        for conf in clist:
-            cyears = []
-            for year in years:
-                if mean and conf == 'ICLR' and year < 2016:
-                    print("Skipping ICLR " + str(year))
-                    # don't include early years of ICLR, too many citings with too few paper!
-                    # ICLR 2015 includes
-                    # Adam: A method for stochastic optimization (44142 citings)
-                    # Very deep convolutional networks for large-scale image recognition (23858)
-                    # so ends up averaging over 2500 citings per paper, which really messes up the graphs... 
-                elif len(papersbyplace['all'][conf][year]) > 0:
-                    cyears.append(year)
-
-            print("conf: " + conf + " cyears: " + str(cyears))
-            plt.plot(cyears, 
-                    [sum([int(paper['Cited by']) 
-                        for paper in papersbyplace['all'][conf][year]]) 
-                        / (len(papersbyplace['all'][conf][year]) if mean else 1) 
-                    for year in cyears],
-                    label = conf,
-                    linewidth = 2,
-                    marker = 'o',
-                    color = confcolor[conf])
-            
-        # plt.xlabel('Year', fontsize=36)
-        plt.ylabel('Mean Citings per Paper' if mean else 'Total Citings', fontsize=basesize)
-        plt.xticks(fontsize=basesize)
-        plt.yticks(fontsize=basesize)
-        plt.grid(False)    
-        plt.tight_layout()
-        print("Writing plot: " + graphname)
-        plt.savefig('scopusoutput/confcitings' + ('-mean' if mean else '-total') + '.pdf')
-        plt.close()
-
-if True: # generate Total Papers
-    # Totals for conferences
-    graphname = 'Total Papers'
-    years = allyears # [conferences[conference]['year'] for conference in conferences if conferences[conference]['name'] == cname]
-
-    plt.figure(figsize=(10, 6))    
-    plt.rcParams['font.family'] = 'Times New Roman' # Helvetica'        
-    basesize = 28
-
-    clist = list(confs)
-    clist.sort(key=lambda conf: len(papersbyplace['all'][conf][maxyear - 1]), reverse=True)
-
-    for conf in clist:
-        cyears = []
-        for year in years:
-            if len(papersbyplace['all'][conf][year]) > 0:
-                cyears.append(year)
-
-        plt.plot(cyears, 
-                [len(papersbyplace['all'][conf][year]) for year in cyears],
-                label = conf,
-                linewidth = 2,
-                marker = 'o',
-                color = confcolor[conf])
-        
-    plt.ylabel('Number of Papers', fontsize=basesize)
-    plt.legend(fontsize=basesize, loc='upper left', 
-                frameon = False,
-                fancybox = False,
-                framealpha = 1.0,
-                labelspacing = 0.3,
-                columnspacing = 1.0,
-                ncol=1)
-    plt.xticks(fontsize=basesize)
-    plt.yticks(fontsize=basesize)
-    plt.grid(False)    
-    plt.tight_layout()
-    print("Writing plot: " + graphname)
-    plt.savefig('scopusoutput/conftotals.pdf')
-    plt.close()
-
 plotunis = uvapeers
 
 plotunis = [
@@ -232,147 +57,301 @@ plotunis = [
 #    'Vanderbilt University',
 ]
 
-if True: # Generate University paper graphs
-    plotunis.sort(key=lambda uni: sum([len(papersbyplace[uni][conf][maxyear])
-                                        for conf in conferences]), reverse=True)
-    graphname = 'All Conferences'
-    years = allyears 
-    plt.figure(figsize=(15, 6))    
-
-    for univ in plotunis:   
-        plt.plot(allyears, 
-                [sum([(len(papersbyplace[univ][conf][year]) / len(papersbyplace['all'][conf][year])) if len(papersbyplace['all'][conf][year]) > 0 else 0
-                    for conf in conferences])
-                for year in allyears],
-                label = university_name(univ),
-                marker = 'o',
-                linewidth = 3 if univ=='University of Virginia' else 1.5, 
-                alpha = 1.0 if univ=='University of Virginia' else 0.5,
-                color = university_color(univ))
-            
-    basesize = 22
-
-    plt.ylabel('Fraction of Papers', fontsize=basesize)
-    plt.legend(fontsize=basesize, 
-            loc=(1.02, 0.1), # -0.12),
-                frameon = False,
-                fancybox = False,
-                framealpha = 1.0,
-                labelspacing = 0.3,
-                columnspacing = 1.0,
-                ncol=1)
-    plt.xticks(fontsize=basesize)
-    plt.yticks(fontsize=basesize)
-    plt.grid(False)
+def load_papers():
+    """
+    Read all the datafiles; returns (papers, conferences, papersbyplace, affiliations)
+    as described for scopusdata.merge_papers.
+    """
+
+    with stage('read datafiles'):
+        (papers, conferences, papersbyplace, affiliations) = read_datafiles(datafiles, ingestworkers)
+
+    print("Papers: %d, Affiliations: %d, Cleaned: %d" % (len(papers), len(affiliations), len(papersbyplace)))
+    return (papers, conferences, papersbyplace, affiliations)
+
+def load_counts(mode=ingestmode):
+    """
+    The PlaceCounts for all the datafiles, reading the papers (mode 'papers'), only
+    tallying them as they are read (mode 'stream'), or from the store (mode 'store').
+    """
+
+    if mode == 'stream':
+        with stage('read datafiles'):
+            return tally_datafiles(datafiles, ingestworkers)
+    if mode == 'store':
+        import store
+        conn = store.open_store(['scopus'], workers=ingestworkers)
+        with stage('count table'):
+            return store.place_counts(conn)
+
+    (papers, conferences, papersbyplace, affiliations) = load_papers()
+    with stage('count table'):
+        return PlaceCounts.from_papers(papers, conferences, papersbyplace)
+
+def print_summary(counts):
+    """
+    Print the papers and citations of each of the plotunis at each conference, by year.
+    """
+
+    for conf in sorted(confs):
+        print("%s:" % (conf))
+        for univ in plotunis:
+            print("%s: papers = %s, citings = %s" % (university_name(univ),
+                                                     counts.papers(univ, conf).tolist(),
+                                                     counts.citings(univ, conf).tolist()))
+
+def print_partners(coaffiliations, n=5, weight='papers'):
+    """
+    Print the top n collaborating places of UVA and each of its peers, over all
+    conferences and years.
+    """
+
+    matrix = coaffiliations.matrix(weight=weight)
+    for univ in uvapeers:
+        print("%s: %s" % (university_name(univ),
+                          ', '.join("%s (%d)" % (university_name(partner), value)
+                                    for (partner, value) in coaffiliations.partners(univ, n, matrix=matrix))))
+
+def make_figures(counts):
+    """
+    Figures for conference totals and for the plotunis' share of papers and citations,
+    from the PlaceCounts for the papers.
+    """
+
+    figures = []
+
+    if True: # generate Total Citings
+        years = allyears # [conferences[conference]['year'] for conference in conferences if conferences[conference]['name'] == cname]
+
+        for mean in [True, False]:
+            graphname = 'Average Citations per Paper' if mean else 'Total Citations'
+            fig = Figure(figsize=(10, 6), rcparams=rcparams)
+            basesize = 28
+
+            clist = list(confs)
+            clist.sort(key=lambda conf: counts.citings('all', conf)[maxyear - minyear],
+                        reverse=True)
+
+            for conf in clist:
+                confpapers = counts.papers('all', conf)
+                confcitings = counts.citings('all', conf)
+                cyears = []
+                for year in years:
+                    if mean and conf == 'ICLR' and year < 2016:
+                        print("Skipping ICLR " + str(year))
+                        # don't include early years of ICLR, too many citings with too few paper!
+                        # ICLR 2015 includes
+                        # Adam: A method for stochastic optimization (44142 citings)
+                        # Very deep convolutional networks for large-scale image recognition (23858)
+                        # so ends up averaging over 2500 citings per paper, which really messes up the graphs... 
+                    elif confpapers[year - minyear] > 0:
+                        cyears.append(year)
+
+                print("conf: " + conf + " cyears: " + str(cyears))
+                fig.plot(cyears, 
+                        [confcitings[year - minyear] / (confpapers[year - minyear] if mean else 1)
+                        for year in cyears],
+                        label = conf,
+                        linewidth = 2,
+                        marker = 'o',
+                        color = confcolor[conf])
             
-    plt.tight_layout()
-    print("Writing plot: " + graphname)
-    plt.savefig('scopusoutput/' + 'allconfs' + '.pdf')
-    plt.close()
-
-if True: # graph papers for each conference
-    for conf in confs:
-        graphname = conf + ' Total Papers by University'
+            # fig.xlabel('Year', fontsize=36)
+            fig.ylabel('Mean Citings per Paper' if mean else 'Total Citings', fontsize=basesize)
+            fig.xticks(fontsize=basesize)
+            fig.yticks(fontsize=basesize)
+            fig.grid(False)    
+            fig.tight_layout()
+            print("Writing plot: " + graphname)
+            fig.savefig('scopusoutput/confcitings' + ('-mean' if mean else '-total') + '.pdf')
+            figures.append(fig)
+
+    if True: # generate Total Papers
+        # Totals for conferences
+        graphname = 'Total Papers'
         years = allyears # [conferences[conference]['year'] for conference in conferences if conferences[conference]['name'] == cname]
-        cyears = []
-        for year in years:
-            if len(papersbyplace['all'][conf][year]) > 0:
-                cyears.append(year)
 
-        plt.figure(figsize=(10, 6))    
+        fig = Figure(figsize=(10, 6), rcparams=rcparams)
+        basesize = 28
+
+        clist = list(confs)
+        clist.sort(key=lambda conf: counts.papers('all', conf)[maxyear - 1 - minyear], reverse=True)
+
+        for conf in clist:
+            confpapers = counts.papers('all', conf)
+            cyears = []
+            for year in years:
+                if confpapers[year - minyear] > 0:
+                    cyears.append(year)
+
+            fig.plot(cyears, 
+                    [confpapers[year - minyear] for year in cyears],
+                    label = conf,
+                    linewidth = 2,
+                    marker = 'o',
+                    color = confcolor[conf])
+        
+        fig.ylabel('Number of Papers', fontsize=basesize)
+        fig.legend(fontsize=basesize, loc='upper left', 
+                    frameon = False,
+                    fancybox = False,
+                    framealpha = 1.0,
+                    labelspacing = 0.3,
+                    columnspacing = 1.0,
+                    ncol=1)
+        fig.xticks(fontsize=basesize)
+        fig.yticks(fontsize=basesize)
+        fig.grid(False)    
+        fig.tight_layout()
+        print("Writing plot: " + graphname)
+        fig.savefig('scopusoutput/conftotals.pdf')
+        figures.append(fig)
+
+    if True: # Generate University paper graphs
+        plotunis.sort(key=lambda uni: counts.papers(uni)[maxyear - minyear], reverse=True)
+        graphname = 'All Conferences'
+        years = allyears 
+        fig = Figure(figsize=(15, 6), rcparams=rcparams)
 
+        # sum over conferences of the university's fraction of that conference's papers
+        allpapers = counts.npapers[counts.placeindex['all']]
         for univ in plotunis:   
-            plt.plot(cyears, 
-                    [len(papersbyplace[univ][conf][year]) for year in cyears],
+            univpapers = np.array([counts.papers(univ, conf) for conf in counts.confindex])
+            fig.plot(allyears, 
+                    np.divide(univpapers, allpapers, out=np.zeros(allpapers.shape), where=allpapers > 0).sum(axis=0),
                     label = university_name(univ),
                     marker = 'o',
-                    linewidth = 2 if univ=='University of Virginia' else 1, 
+                    linewidth = 3 if univ=='University of Virginia' else 1.5, 
                     alpha = 1.0 if univ=='University of Virginia' else 0.5,
                     color = university_color(univ))
             
-        plt.xlabel('Year', fontsize=16)
-        plt.ylabel('Number of Papers', fontsize=16)
-        plt.title(graphname, fontsize=20)
-
-        plt.legend(fontsize=14, loc='center left', frameon = False, fancybox = False,
-                    framealpha = 1.0, labelspacing = 0.3, columnspacing = 1.0, ncol=2)
-        plt.xticks(fontsize=16)
-        plt.yticks(fontsize=16)
-        plt.grid(False)
+        basesize = 22
+
+        fig.ylabel('Fraction of Papers', fontsize=basesize)
+        fig.legend(fontsize=basesize, 
+                loc=(1.02, 0.1), # -0.12),
+                    frameon = False,
+                    fancybox = False,
+                    framealpha = 1.0,
+                    labelspacing = 0.3,
+                    columnspacing = 1.0,
+                    ncol=1)
+        fig.xticks(fontsize=basesize)
+        fig.yticks(fontsize=basesize)
+        fig.grid(False)
             
-        plt.tight_layout()
+        fig.tight_layout()
         print("Writing plot: " + graphname)
-        plt.savefig('scopusoutput/' + conf + '.pdf')
-        plt.close()
-
-if True: # Generate University citation graphs
-    graphname = 'Citations Across All Conferences'
-    years = allyears 
-    plt.figure(figsize=(15, 6))    
-    basesize = 22
-
-    for univ in plotunis:   
-        plt.plot(allyears, 
-                 [sum([int(paper['Cited by']) 
-                        for paper in papersbyplace[univ][conf][year]
-                        for conf in conferences]) 
-                    / max(1, sum([int(paper['Cited by']) 
-                            for paper in papersbyplace['all'][conf][year]
-                            for conf in conferences]))
-                     for year in allyears],    
-                label = university_name(univ),
-                marker = 'o',
-                linewidth = 3 if univ=='University of Virginia' else 1.5, 
-                alpha = 1.0 if univ=='University of Virginia' else 0.5,
-                color = university_color(univ))
-
-    plt.ylabel('Fraction of Citings', fontsize=basesize)
-    plt.legend(fontsize=basesize, loc=(1.02, 0.1), frameon = False, fancybox = False,
-                framealpha = 1.0, labelspacing = 0.3, columnspacing = 1.0, ncol=1)
-    plt.xticks(fontsize=basesize)
-    plt.yticks(fontsize=basesize)
-    plt.grid(False)            
-    plt.tight_layout()
-    print("Writing plot: " + graphname)
-    plt.savefig('scopusoutput/' + 'fraccitings' + '.pdf')
-    plt.close()
-
-if True: # graph citings for each conference
-    for conf in confs:
-        graphname = conf + ' Citings by University'
-        years = allyears # [conferences[conference]['year'] for conference in conferences if conferences[conference]['name'] == cname]
-        cyears = []
-        for year in years:
-            if len(papersbyplace['all'][conf][year]) > 0:
-                cyears.append(year)
+        fig.savefig('scopusoutput/' + 'allconfs' + '.pdf')
+        figures.append(fig)
+
+    if True: # graph papers for each conference
+        for conf in confs:
+            graphname = conf + ' Total Papers by University'
+            years = allyears # [conferences[conference]['year'] for conference in conferences if conferences[conference]['name'] == cname]
+            confpapers = counts.papers('all', conf)
+            cyears = []
+            for year in years:
+                if confpapers[year - minyear] > 0:
+                    cyears.append(year)
 
-        plt.figure(figsize=(10, 6))    
+            fig = Figure(figsize=(10, 6), rcparams=rcparams)
 
+            for univ in plotunis:   
+                fig.plot(cyears, 
+                        [counts.papers(univ, conf)[year - minyear] for year in cyears],
+                        label = university_name(univ),
+                        marker = 'o',
+                        linewidth = 2 if univ=='University of Virginia' else 1, 
+                        alpha = 1.0 if univ=='University of Virginia' else 0.5,
+                        color = university_color(univ))
+            
+            fig.xlabel('Year', fontsize=16)
+            fig.ylabel('Number of Papers', fontsize=16)
+            fig.title(graphname, fontsize=20)
+
+            fig.legend(fontsize=14, loc='center left', frameon = False, fancybox = False,
+                        framealpha = 1.0, labelspacing = 0.3, columnspacing = 1.0, ncol=2)
+            fig.xticks(fontsize=16)
+            fig.yticks(fontsize=16)
+            fig.grid(False)
+            
+            fig.tight_layout()
+            print("Writing plot: " + graphname)
+            fig.savefig('scopusoutput/' + conf + '.pdf')
+            figures.append(fig)
+
+    if True: # Generate University citation graphs
+        graphname = 'Citations Across All Conferences'
+        years = allyears 
+        fig = Figure(figsize=(15, 6), rcparams=rcparams)
+        basesize = 22
+
+        allcitings = counts.citings('all')
         for univ in plotunis:   
-            plt.plot(cyears, 
-                     [sum([int(paper['Cited by']) 
-                           for paper in papersbyplace[univ][conf][year]]) 
-                        / sum([int(paper['Cited by']) 
-                            for paper in papersbyplace['all'][conf][year]])
-                     for year in cyears],    
+            fig.plot(allyears, 
+                     counts.citings(univ) / np.maximum(1, allcitings),
                     label = university_name(univ),
                     marker = 'o',
-                    linewidth = 2 if univ=='University of Virginia' else 1, 
+                    linewidth = 3 if univ=='University of Virginia' else 1.5, 
                     alpha = 1.0 if univ=='University of Virginia' else 0.5,
                     color = university_color(univ))
+
+        fig.ylabel('Fraction of Citings', fontsize=basesize)
+        fig.legend(fontsize=basesize, loc=(1.02, 0.1), frameon = False, fancybox = False,
+                    framealpha = 1.0, labelspacing = 0.3, columnspacing = 1.0, ncol=1)
+        fig.xticks(fontsize=basesize)
+        fig.yticks(fontsize=basesize)
+        fig.grid(False)            
+        fig.tight_layout()
+        print("Writing plot: " + graphname)
+        fig.savefig('scopusoutput/' + 'fraccitings' + '.pdf')
+        figures.append(fig)
+
+    if True: # graph citings for each conference
+        for conf in confs:
+            graphname = conf + ' Citings by University'
+            years = allyears # [conferences[conference]['year'] for conference in conferences if conferences[conference]['name'] == cname]
+            confpapers = counts.papers('all', conf)
+            confcitings = counts.citings('all', conf)
+            cyears = []
+            for year in years:
+                if confpapers[year - minyear] > 0:
+                    cyears.append(year)
+
+            fig = Figure(figsize=(10, 6), rcparams=rcparams)
+
+            for univ in plotunis:   
+                fig.plot(cyears, 
+                         [counts.citings(univ, conf)[year - minyear] / confcitings[year - minyear]
+                          for year in cyears],
+                        label = university_name(univ),
+                        marker = 'o',
+                        linewidth = 2 if univ=='University of Virginia' else 1, 
+                        alpha = 1.0 if univ=='University of Virginia' else 0.5,
+                        color = university_color(univ))
             
-        plt.xlabel('Year', fontsize=16)
-        plt.ylabel('Fraction of Citings', fontsize=16)
-        plt.title(graphname, fontsize=20)
+            fig.xlabel('Year', fontsize=16)
+            fig.ylabel('Fraction of Citings', fontsize=16)
+            fig.title(graphname, fontsize=20)
 
-        plt.legend(fontsize=14, loc='center left', frameon = False, fancybox = False,
-                   framealpha = 1.0, labelspacing = 0.3, columnspacing = 1.0, ncol=2)
+            fig.legend(fontsize=14, loc='center left', frameon = False, fancybox = False,
+                       framealpha = 1.0, labelspacing = 0.3, columnspacing = 1.0, ncol=2)
 
-        plt.xticks(fontsize=16)
-        plt.yticks(fontsize=16)
-        plt.grid(False)
+            fig.xticks(fontsize=16)
+            fig.yticks(fontsize=16)
+            fig.grid(False)
             
-        plt.tight_layout()
-        print("Writing plot: " + graphname)
-        plt.savefig('scopusoutput/' + conf + '-citings.pdf')
-        plt.close()
+            fig.tight_layout()
+            print("Writing plot: " + graphname)
+            fig.savefig('scopusoutput/' + conf + '-citings.pdf')
+            figures.append(fig)
+
+    return figures
+
+if __name__ == '__main__':
+    counts = load_counts()
+    with stage('render'):
+        render_figures(make_figures(counts), renderworkers)
+
+    write_profile('scopus')
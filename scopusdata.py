@@ -0,0 +1,660 @@
+### 
+### scopusdata.py
+###
+### Reading the scopus exports (one process per file) for scopus.py.
+###
+### Written for UVA AI Research Task Force report.
+###
+
+from collections import namedtuple
+import codecs
+import csv
+import re
+from operator import itemgetter
+
+import numpy as np
+
+from universities import *
+from instrument import add_counts
+from render import run_pool
+
+# Scopus queries to get the data:
+#
+# - CONFNAME ( "ICML" ) AND PUBYEAR > 2020 AND ( LIMIT-TO ( DOCTYPE , "cp" ) ) AND ( LIMIT-TO ( EXACTSRCTITLE , "Proceedings Of Machine Learning Research" ) )
+# - SRCTITLE ( "Advances in Neural Information Processing Systems" ) AND ( LIMIT-TO ( DOCTYPE , "cp" ) )
+# - SRCTITLE ( "International Conference on Learning Representations" ) AND ( LIMIT-TO ( EXACTSRCTITLE , "Iclr 2022 10th International Conference On Learning Representations" ) OR LIMIT-TO ( EXACTSRCTITLE , "Iclr 2021 9th International Conference On Learning Representations" ) OR LIMIT-TO ( EXACTSRCTITLE , "8th International Conference On Learning Representations Iclr 2020" ) OR LIMIT-TO ( EXACTSRCTITLE , "7th International Conference On Learning Representations Iclr 2019" ) OR LIMIT-TO ( EXACTSRCTITLE , "6th International Conference On Learning Representations Iclr 2018 Conference Track Proceedings" ) OR LIMIT-TO ( EXACTSRCTITLE , "5th International Conference On Learning Representations Iclr 2017 Conference Track Proceedings" ) OR LIMIT-TO ( EXACTSRCTITLE , "4th International Conference On Learning Representations Iclr 2016 Conference Track Proceedings" ) OR LIMIT-TO ( EXACTSRCTITLE , "2nd International Conference On Learning Representations Iclr 2014 Conference Track Proceedings" ) OR LIMIT-TO ( EXACTSRCTITLE , "3rd International Conference On Learning Representations Iclr 2015 Conference Track Proceedings" ) OR LIMIT-TO ( EXACTSRCTITLE , "1st International Conference On Learning Representations Iclr 2013 Conference Track Proceedings" ) )
+#      (Note: selected to avoid including workshops)
+
+datafiles = [
+    ("data/neurips-all-scopus.csv", "NeurIPS"),
+    ("data/AAAI-2007-2023-scopus.csv", "AAAI"),
+    ("data/ICML-1988-2020-scopus.csv", "ICML"),
+    ("data/ICML-2021-2023-scopus.csv", "ICML"),
+    ("data/iclr-all-scopus.csv", "ICLR"),
+]
+
+# For the main graphs, used 2012-2022; for some of the conference graphs used 2000-2023.
+
+minyear = 2012
+maxyear = 2022
+
+# minyear = 2000
+# maxyear = 2023
+
+allyears = range(minyear, maxyear + 1)
+
+# Just the columns of the scopus exports that are used (out of several dozen), with year
+# and citations already parsed.  doi and eid are '' if the export does not have them.
+Paper = namedtuple('Paper', ['title', 'year', 'conference', 'affiliations', 'citedby', 'doi', 'eid'])
+paperfields = ['Title', 'Year', 'Conference name', 'Affiliations', 'Cited by']
+optionalfields = ['DOI', 'EID']
+
+# Codes for the keys of the merged structures from merge_papers (decode with .names).
+# Per file, read_papers uses codebooks of its own, which merge_papers maps to these.
+placecodes = place_codebook()
+affiliationcodes = Codebook()
+conferencecodes = Codebook()
+
+# read_export uses the first of these that is installed (pyarrow and pandas parse in
+# native code, pyarrow on several threads), or the csv module
+csvengines = ['pyarrow', 'pandas', 'csv']
+
+def detect_encoding(fname, blocksize=1 << 24):
+    """
+    'utf-8-sig' if fname is valid UTF-8 (with or without a byte order mark), otherwise
+    'ISO-8859-1', which the exports were always read as before and which never fails.
+    """
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    with open(fname, 'rb') as file:
+        try:
+            while True:
+                block = file.read(blocksize)
+                decoder.decode(block, final=not block)
+                if not block:
+                    return 'utf-8-sig'
+        except UnicodeDecodeError:
+            return 'ISO-8859-1'
+
+def read_export(fname, engine=None):
+    """
+    Just the used columns of the scopus export fname, typed: 'year' and 'citedby'
+    (0 where empty) as int64 arrays, 'conference' as an array of codes into
+    'conferences' (the distinct conference names), and 'title', 'affiliations', 'doi'
+    and 'eid' ('' if the export does not have them) as lists of strings.  engine is one
+    of csvengines, by default the first one installed.
+    """
+
+    encoding = detect_encoding(fname)
+    with open(fname, encoding=encoding) as csvfile:
+        headers = next(csv.reader(csvfile))
+    fields = paperfields + [field for field in optionalfields if field in headers]
+
+    if engine is None:
+        engine = next(name for name in csvengines if name == 'csv' or installed(name))
+    columns = {'pyarrow': arrow_columns, 'pandas': pandas_columns, 'csv': csv_columns}[engine](fname, encoding, fields)
+
+    nrows = len(columns['Year'])
+    return {'title': columns['Title'],
+            'year': columns['Year'],
+            'conference': columns['Conference name'][0],
+            'conferences': columns['Conference name'][1],
+            'affiliations': columns['Affiliations'],
+            'citedby': columns['Cited by'],
+            'doi': columns['DOI'] if 'DOI' in columns else [''] * nrows,
+            'eid': columns['EID'] if 'EID' in columns else [''] * nrows}
+
+def installed(module):
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+# Each of these returns the fields of the export as a dict of lists of strings, except
+# for int64 arrays for 'Year' and 'Cited by' and (codes, names) for 'Conference name'.
+
+def csv_columns(fname, encoding, fields):
+    with open(fname, encoding=encoding, newline='') as csvfile:
+        sreader = csv.reader(csvfile, delimiter=',', quotechar='"')
+        headers = next(sreader)
+        getfields = itemgetter(*[headers.index(field) for field in fields])
+        # transpose into one tuple of strings per column, without a Python loop per row
+        text = list(zip(*map(getfields, sreader))) or [()] * len(fields)
+
+    columns = {field: list(values) for (field, values) in zip(fields, text)}
+    nrows = len(columns['Year'])
+    columns['Year'] = np.fromiter(map(int, columns['Year']), dtype=np.int64, count=nrows)
+    columns['Cited by'] = np.fromiter((int(citedby) if citedby else 0 for citedby in columns['Cited by']),
+                                      dtype=np.int64, count=nrows)
+    names = sorted(set(columns['Conference name']))
+    code = {name: i for (i, name) in enumerate(names)}
+    columns['Conference name'] = (np.fromiter(map(code.__getitem__, columns['Conference name']), dtype=np.int64, count=nrows),
+                                  names)
+    return columns
+
+def arrow_columns(fname, encoding, fields):
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    types = {field: pa.string() for field in fields}
+    types.update({'Year': pa.int64(), 'Cited by': pa.int64()})
+    table = pacsv.read_csv(fname,
+                           read_options=pacsv.ReadOptions(encoding='utf8' if encoding == 'utf-8-sig' else encoding,
+                                                          use_threads=True, block_size=1 << 24),
+                           # quoted fields (titles, abstracts) may hold line breaks
+                           parse_options=pacsv.ParseOptions(newlines_in_values=True),
+                           convert_options=pacsv.ConvertOptions(include_columns=fields, column_types=types,
+                                                                strings_can_be_null=False))
+
+    columns = {field: table[field].to_pylist() for field in fields
+               if field not in ['Year', 'Cited by', 'Conference name']}
+    columns['Year'] = table['Year'].to_numpy()
+    columns['Cited by'] = table['Cited by'].fill_null(0).to_numpy()
+    # codes into the sorted names, as the other readers give
+    conference = table['Conference name'].combine_chunks().dictionary_encode()
+    names = conference.dictionary.to_pylist()
+    order = np.argsort(np.array(names, dtype=object))
+    rank = np.empty(len(names), dtype=np.int64)
+    rank[order] = np.arange(len(names))
+    columns['Conference name'] = (rank[conference.indices.to_numpy()], [names[i] for i in order])
+    return columns
+
+def pandas_columns(fname, encoding, fields):
+    import pandas as pd
+
+    frame = pd.read_csv(fname, usecols=fields, encoding=encoding, dtype=str,
+                        keep_default_na=False, na_filter=False)
+
+    columns = {field: frame[field].tolist() for field in fields
+               if field not in ['Year', 'Cited by', 'Conference name']}
+    columns['Year'] = frame['Year'].astype(np.int64).to_numpy()
+    columns['Cited by'] = frame['Cited by'].replace('', '0').astype(np.int64).to_numpy()
+    conference = frame['Conference name'].astype('category')
+    columns['Conference name'] = (conference.cat.codes.to_numpy().astype(np.int64),
+                                  conference.cat.categories.tolist())
+    return columns
+
+def normalize_title(title):
+    return ' '.join(re.sub(r'[\W_]+', ' ', title.casefold()).split())
+
+class DuplicateIndex:
+    """
+    Hash index of the papers seen so far, by DOI, by EID and by normalized title and
+    year, to catch the same paper turning up again in the same or another export.
+    Papers with the same DOI or EID are the same; papers with the same title and year
+    are the same unless they have different DOIs or EIDs.  Linear time and memory in
+    the number of papers.
+    """
+
+    def __init__(self):
+        self.keys = {}
+        self.duplicates = 0
+
+    @staticmethod
+    def paper_keys(title, year, doi, eid):
+        """
+        The (DOI, EID, (title, year)) a paper is compared by, normalized; the title key
+        is None for a title too short to go by.
+        """
+
+        title = normalize_title(title)
+        return doi.strip().lower(), eid.strip(), ((title, year) if len(title) >= 2 else None)
+
+    def add(self, paper):
+        """
+        Index paper and return True, or return False if it is a duplicate of one already
+        added.
+        """
+
+        return self.add_keys(*self.paper_keys(paper.title, paper.year, paper.doi, paper.eid))
+
+    def add_keys(self, doi, eid, title):
+        """
+        add for a paper's paper_keys.
+        """
+
+        keys = [('doi', doi) if doi else None, ('eid', eid) if eid else None,
+                ('title',) + title if title is not None else None]
+
+        for key in keys[:2]:
+            if key in self.keys:
+                self.duplicates += 1
+                return False
+        if keys[2] in self.keys:
+            (otherdoi, othereid) = self.keys[keys[2]]
+            if not (doi and otherdoi and doi != otherdoi) and not (eid and othereid and eid != othereid):
+                self.duplicates += 1
+                return False
+
+        for key in keys:
+            if key is not None:
+                self.keys.setdefault(key, (doi, eid))
+        return True
+
+# profile counters for the affiliations that are not known institutions, by
+# resolver.classify
+classcounter = {'unknown': 'unknown affiliations', 'matched': 'fuzzy-matched affiliations'}
+
+def read_papers(fname, conf, columns=None):
+    """
+    Read the scopus export fname, of papers at conf (or use its columns, if they were
+    already read with read_export).  Returns a dict with the
+    'conference' (conf), the list of Paper records ('papers') and, for the papers in
+    [minyear, maxyear], the 'conferences', 'papersbyplace' and 'affiliations' maps
+    described for merge_papers, with ids numbered from 0 in this file and keys coded
+    with this file's 'places', 'affiliationnames' and 'conferencenames', and 'counts' for
+    the profile.  Has no side effects, so files can be read in parallel.
+    """
+
+    counts = {'papers skipped (year)': 0, 'paper affiliations': 0, 'unknown affiliations': 0,
+              'fuzzy-matched affiliations': 0}
+    cacheinfo = resolver.resolve.cache_info()
+    places = place_codebook()
+    raws = Codebook()
+    rawplace = [] # place code of each raw affiliation code
+    rawclass = [] # and its resolver.classify
+    allplaces = places.code('all')
+
+    conferences = {conf: {nyear: set() for nyear in allyears}}
+    papersbyplace = {allplaces: {conf: {nyear: set() for nyear in allyears}}}
+    affiliations = {}
+
+    if columns is None:
+        columns = read_export(fname)
+    conferencenames = columns['conferences']
+    conferencecode = columns['conference'].tolist()
+    papers = list(map(Paper, columns['title'], columns['year'].tolist(),
+                      [conferencenames[code] for code in conferencecode],
+                      columns['affiliations'], columns['citedby'].tolist(), columns['doi'], columns['eid']))
+    del columns
+
+    print ("Read papers: " + str(len(papers)))
+    
+    for (pid, paper) in enumerate(papers):
+        if len(paper.title.strip()) < 2:
+            pass
+        if not paper.affiliations:
+            pass # print("No Affiliations for paper: " + paper.title)
+
+        year = paper.year # Conference date"][-4:])
+
+        if year < minyear or year > maxyear:
+            counts['papers skipped (year)'] += 1
+            continue # skip papers out of year range
+
+        conferences[conf][year].add(conferencecode[pid])
+        papersbyplace[allplaces][conf][year].add(pid)
+
+        for affiliation in paper.affiliations.split(';'):
+            raw = raws.code(affiliation)
+            if raw == len(rawplace):
+                # each distinct raw affiliation is resolved once
+                name = resolver.resolve(affiliation)
+                rawplace.append(places.code(name))
+                rawclass.append(resolver.classify(affiliation, name))
+            place = rawplace[raw]
+
+            affiliations.setdefault(raw, []).append(pid)
+            counts['paper affiliations'] += 1
+            if rawclass[raw] != 'known':
+                counts[classcounter[rawclass[raw]]] += 1
+
+            if place not in papersbyplace:
+                papersbyplace[place] = {conf: {nyear: set() for nyear in allyears}}
+
+            # a set, so a paper with several affiliations at one place is counted once
+            papersbyplace[place][conf][year].add(pid)
+
+    counts['papers read'] = len(papers)
+    counts['resolver cache hits'] = resolver.resolve.cache_info().hits - cacheinfo.hits
+    counts['resolver cache misses'] = resolver.resolve.cache_info().misses - cacheinfo.misses
+
+    return {'conference': conf, 'papers': papers, 'conferences': conferences,
+            'papersbyplace': papersbyplace, 'affiliations': affiliations, 'counts': counts,
+            'places': places.names, 'affiliationnames': raws.names, 'conferencenames': conferencenames}
+
+def dedupe(parts):
+    """
+    Number the papers in the results of read_papers, in order, dropping papers already
+    seen (in this or an earlier part; see DuplicateIndex).  Returns (papers, newids): the
+    distinct Paper records, a paper's id being its index, and for each part the id of
+    each of its papers, None for duplicates.
+    """
+
+    papers = []
+    newids = []
+    index = DuplicateIndex()
+    for part in parts:
+        newid = []
+        for paper in part['papers']:
+            if index.add(paper):
+                newid.append(len(papers))
+                papers.append(paper)
+            else:
+                newid.append(None)
+        newids.append(newid)
+
+    print("Duplicate papers merged: %d" % (index.duplicates))
+    add_counts({'duplicate papers merged': index.duplicates})
+    return papers, newids
+
+def merge_papers(parts):
+    """
+    Combine the results of read_papers, in order, renumbering each file's papers to
+    follow the ones before and dropping papers already seen (in this or an earlier
+    file; see DuplicateIndex).  Returns (papers, conferences, papersbyplace, affiliations):
+
+      papers - list of Paper records; a paper's id is its index
+      conferences[conf][year] - set of codes (in conferencecodes) of the conference
+         names seen in the papers
+      papersbyplace[place][conf][year] - set of ids of the papers with an affiliation
+         at place, a code in placecodes (placecodes.code('all') has every paper)
+      affiliations[raw affiliation] - list of ids of the papers that list it, by code
+         in affiliationcodes
+    """
+
+    conferences = {}
+    papersbyplace = {placecodes.code('all'): {}}
+    affiliations = {}
+    (papers, newids) = dedupe(parts)
+
+    for (part, newid) in zip(parts, newids):
+        add_counts(part['counts'])
+        # from the file's codes to the shared ones
+        placemap = placecodes.encode(part['places']).tolist()
+        rawmap = affiliationcodes.encode(part['affiliationnames']).tolist()
+        conferencemap = conferencecodes.encode(part['conferencenames']).tolist()
+
+        for (conf, byyear) in part['conferences'].items():
+            for (year, names) in byyear.items():
+                conferences.setdefault(conf, {}).setdefault(year, set()).update(conferencemap[code] for code in names)
+
+        for (place, byconf) in part['papersbyplace'].items():
+            for (conf, byyear) in byconf.items():
+                merged = papersbyplace.setdefault(placemap[place], {}).setdefault(conf, {})
+                for (year, ids) in byyear.items():
+                    merged.setdefault(year, set()).update(newid[pid] for pid in ids if newid[pid] is not None)
+
+        for (affiliation, ids) in part['affiliations'].items():
+            affiliations.setdefault(rawmap[affiliation], []).extend(newid[pid] for pid in ids if newid[pid] is not None)
+
+    return papers, conferences, papersbyplace, affiliations
+
+def read_parts(files=datafiles, workers=None):
+    """
+    read_papers for each of the (fname, conf) files, on a pool of worker processes (None
+    for one per CPU, 1 to read them in this process).
+    """
+
+    return run_pool(read_papers, files, workers)
+
+def read_datafiles(files=datafiles, workers=None):
+    """
+    Read and merge all the (fname, conf) files (see read_parts).
+    """
+
+    return merge_papers(read_parts(files, workers))
+
+def tally_papers(fname, conf):
+    """
+    Read the scopus export fname, of papers at conf, keeping only the number of papers
+    and their total citations for each (place, year) in [minyear, maxyear], and the keys
+    to find duplicates by, instead of the papers themselves.
+    Returns a dict with the 'conference', the 'tallies' (tallies[place][year - minyear]
+    is [papers, citations], for place a code into 'places'; 'all' has every paper),
+    'counts' for the profile, and the 'keys' of every paper, in order, for finding
+    duplicates: (DuplicateIndex.paper_keys, year, citations, place codes), with no place
+    codes for a paper outside the years.
+    """
+
+    counts = {'papers skipped (year)': 0, 'paper affiliations': 0, 'unknown affiliations': 0,
+              'fuzzy-matched affiliations': 0, 'papers read': 0}
+    cacheinfo = resolver.resolve.cache_info()
+    places = place_codebook()
+    placeof = {} # (place code, resolver.classify) of each raw affiliation
+    allplaces = places.code('all')
+    tallies = {allplaces: [[0, 0] for year in allyears]}
+    keys = []
+
+    # row by row, so memory does not grow with the file (read_export would load it all)
+    with open(fname, encoding=detect_encoding(fname), newline='') as csvfile:
+        sreader = csv.reader(csvfile, delimiter=',', quotechar='"')
+        headers = next(sreader)
+        getfields = itemgetter(*[headers.index(field) for field in paperfields])
+        # '' if the export does not have them, as in read_export
+        getids = [itemgetter(headers.index(field)) if field in headers else lambda row: ''
+                  for field in optionalfields]
+        for row in sreader:
+            (title, year, conference, affils, citedby) = getfields(row)
+            (doi, eid) = [getid(row) for getid in getids]
+            counts['papers read'] += 1
+            year = int(year)
+            citedby = int(citedby) if citedby else 0
+            paperkeys = DuplicateIndex.paper_keys(title, year, doi, eid)
+            if year < minyear or year > maxyear:
+                counts['papers skipped (year)'] += 1
+                keys.append((paperkeys, year, citedby, ()))
+                continue
+
+            # a set, so a paper with several affiliations at one place is counted once
+            paperplaces = {allplaces}
+            for affiliation in affils.split(';'):
+                resolved = placeof.get(affiliation)
+                if resolved is None:
+                    name = resolver.resolve(affiliation)
+                    resolved = placeof[affiliation] = (places.code(name), resolver.classify(affiliation, name))
+                (place, kind) = resolved
+                counts['paper affiliations'] += 1
+                if kind != 'known':
+                    counts[classcounter[kind]] += 1
+                paperplaces.add(place)
+
+            keys.append((paperkeys, year, citedby, tuple(paperplaces)))
+            for place in paperplaces:
+                if place not in tallies:
+                    tallies[place] = [[0, 0] for nyear in allyears]
+                tally = tallies[place][year - minyear]
+                tally[0] += 1
+                tally[1] += citedby
+
+    print ("Read papers: " + str(counts['papers read']))
+    counts['resolver cache hits'] = resolver.resolve.cache_info().hits - cacheinfo.hits
+    counts['resolver cache misses'] = resolver.resolve.cache_info().misses - cacheinfo.misses
+
+    return {'conference': conf, 'tallies': tallies, 'counts': counts, 'places': places.names,
+            'keys': keys}
+
+def tally_datafiles(files=datafiles, workers=None):
+    """
+    The PlaceCounts for all the (fname, conf) files, read with tally_papers on a pool of
+    worker processes (None for one per CPU, 1 to read them in this process).  Duplicate
+    papers are taken out of the tallies as in read_datafiles, so this keeps every
+    paper's keys (but not the papers) in memory.
+    """
+
+    parts = run_pool(tally_papers, files, workers)
+
+    # papers already seen, in this or an earlier file, are subtracted again
+    index = DuplicateIndex()
+    for part in parts:
+        add_counts(part['counts'])
+        for (paperkeys, year, citedby, paperplaces) in part.pop('keys'):
+            if not index.add_keys(*paperkeys):
+                for place in paperplaces:
+                    tally = part['tallies'][place][year - minyear]
+                    tally[0] -= 1
+                    tally[1] -= citedby
+
+    print("Duplicate papers merged: %d" % (index.duplicates))
+    add_counts({'duplicate papers merged': index.duplicates})
+    return PlaceCounts.from_tallies(parts)
+
+class PlaceCounts:
+    """
+    Number of papers and total citations for every (place, conference, year), including
+    'all'.  npapers and ncitings are indexed by [placeindex[place], confindex[conf],
+    year - minyear].
+    """
+
+    def __init__(self, placeindex, confindex, npapers, ncitings):
+        self.placeindex = placeindex
+        self.confindex = confindex
+        self.npapers = npapers
+        self.ncitings = ncitings
+
+    @classmethod
+    def from_papers(cls, papers, conferences, papersbyplace):
+        """
+        The counts for the places in papersbyplace, from merge_papers, in one pass.
+        """
+
+        placeindex = {placecodes.names[place]: i for i, place in enumerate(papersbyplace)}
+        confindex = {conf: i for i, conf in enumerate(sorted(conferences))}
+        citedby = np.array([paper.citedby for paper in papers], dtype=np.int64)
+
+        npapers = np.zeros((len(placeindex), len(confindex), len(allyears)), dtype=np.int64)
+        ncitings = np.zeros_like(npapers)
+
+        for (p, place) in enumerate(papersbyplace):
+            for (conf, byyear) in papersbyplace[place].items():
+                c = confindex[conf]
+                for (y, year) in enumerate(allyears):
+                    ids = np.fromiter(byyear[year], dtype=np.int64, count=len(byyear[year]))
+                    npapers[p, c, y] = len(ids)
+                    ncitings[p, c, y] = citedby[ids].sum()
+
+        return cls(placeindex, confindex, npapers, ncitings)
+
+    @classmethod
+    def from_tallies(cls, parts):
+        """
+        The counts from the results of tally_papers, adding up files for the same
+        conference.
+        """
+
+        placeindex = {}
+        for part in parts:
+            for place in part['tallies']:
+                placeindex.setdefault(part['places'][place], len(placeindex))
+        confindex = {conf: i for i, conf in enumerate(sorted({part['conference'] for part in parts}))}
+
+        totals = np.zeros((len(placeindex), len(confindex), len(allyears), 2), dtype=np.int64)
+        for part in parts:
+            c = confindex[part['conference']]
+            for (place, tally) in part['tallies'].items():
+                totals[placeindex[part['places'][place]], c] += tally
+
+        return cls(placeindex, confindex, totals[..., 0], totals[..., 1])
+
+    def row(self, table, place, conf):
+        # zeros for a place with no papers
+        if place not in self.placeindex:
+            return np.zeros(len(allyears), dtype=table.dtype)
+        if conf is None:
+            return table[self.placeindex[place]].sum(axis=0)
+        return table[self.placeindex[place], self.confindex[conf]]
+
+    def papers(self, place, conf=None):
+        """
+        Papers at place for each of allyears, at conf or (None) all conferences.
+        """
+
+        return self.row(self.npapers, place, conf)
+
+    def citings(self, place, conf=None):
+        """
+        Total citations of the papers at place for each of allyears, at conf or (None)
+        all conferences.
+        """
+
+        return self.row(self.ncitings, place, conf)
+
+class CoAffiliations:
+    """
+    Collaboration between places: for each (conference, year), sparse places x places
+    matrices of the number of papers with affiliations at both places, and of their total
+    citations.  The diagonal has each place's own papers.  Needs scipy.
+    """
+
+    def __init__(self, places, confindex, npapers, ncitings):
+        self.places = places
+        self.placeindex = {place: i for i, place in enumerate(places)}
+        self.confindex = confindex
+        self.npapers = npapers
+        self.ncitings = ncitings
+
+    @classmethod
+    def from_papers(cls, papers, conferences, papersbyplace):
+        """
+        The matrices for the papers from merge_papers, from the papers x places incidence
+        matrix of papersbyplace, with one sparse product per conference and year.
+        """
+
+        import scipy.sparse as sparse
+
+        places = [place for place in papersbyplace if placecodes.names[place] not in ('all', None)]
+        confindex = {conf: i for i, conf in enumerate(sorted(conferences))}
+        citedby = np.array([paper.citedby for paper in papers], dtype=np.int64)
+
+        # (paper, place) pairs; each place's ids are a set, so a pair appears once
+        pids = []
+        codes = []
+        for (p, place) in enumerate(places):
+            for byyear in papersbyplace[place].values():
+                for ids in byyear.values():
+                    pids.append(np.fromiter(ids, dtype=np.int64, count=len(ids)))
+                    codes.append(np.full(len(ids), p, dtype=np.int64))
+        pids = np.concatenate(pids) if pids else np.zeros(0, dtype=np.int64)
+        codes = np.concatenate(codes) if codes else np.zeros(0, dtype=np.int64)
+        incidence = sparse.csr_matrix((np.ones(len(pids), dtype=np.int64), (pids, codes)),
+                                      shape=(len(papers), len(places)))
+
+        npapers = {}
+        ncitings = {}
+        for (conf, byyear) in papersbyplace[placecodes.code('all')].items():
+            for (year, ids) in byyear.items():
+                rows = np.fromiter(ids, dtype=np.int64, count=len(ids))
+                selected = incidence[rows]
+                npapers[conf, year] = (selected.T @ selected).tocsr()
+                ncitings[conf, year] = (selected.T @ selected.multiply(citedby[rows][:, None])).tocsr()
+
+        return cls([placecodes.names[place] for place in places], confindex, npapers, ncitings)
+
+    def matrix(self, conf=None, years=allyears, weight='papers'):
+        """
+        The places x places matrix weighted by 'papers' or 'citings', summed over years
+        at conf or (None) all conferences.
+        """
+
+        tables = {'papers': self.npapers, 'citings': self.ncitings}[weight]
+        confs = list(self.confindex) if conf is None else [conf]
+        total = None
+        for c in confs:
+            for year in years:
+                if (c, year) in tables:
+                    total = tables[c, year] if total is None else total + tables[c, year]
+        if total is None:
+            import scipy.sparse as sparse
+            total = sparse.csr_matrix((len(self.places), len(self.places)), dtype=np.int64)
+        return total
+
+    def partners(self, place, n=10, conf=None, years=allyears, weight='papers', matrix=None):
+        """
+        The top n places that place has papers with (over years, at conf or all
+        conferences), as a list of (partner, papers or citings), most first.  Pass the
+        matrix from matrix() to query several places without summing it again.
+        """
+
+        if place not in self.placeindex:
+            return []
+        if matrix is None:
+            matrix = self.matrix(conf, years, weight)
+
+        p = self.placeindex[place]
+        row = matrix.getrow(p)
+        (cols, values) = (row.indices, row.data)
+        keep = (cols != p) & (values > 0)
+        (cols, values) = (cols[keep], values[keep])
+        top = np.argsort(-values, kind='stable')[:n]
+        return [(self.places[cols[i]], int(values[i])) for i in top]
@@ -0,0 +1,190 @@
+###
+### store.py
+###
+### Optional SQLite store of the scopus papers and the OpenAlex scores, so repeated
+### analyses query indexed tables instead of parsing the CSVs again:
+###
+###    papers(id, title, year, conference, conferencename, citedby, doi, eid)
+###    paperplaces(paper, affiliation, place, conference, year, citedby)
+###       one row per affiliation of each paper, with the cleaned place;
+###       indexed on (place, conference, year)
+###    scores(university, area, year, score)
+###       one row per paper and area; indexed on (university, area, year)
+###
+### Each dataset is (re)loaded when its source files or the settings that cleaning depends
+### on have changed since it was stored.  For example, Duke's ICLR papers in 2019 with
+### more than 100 citations:
+###
+###    python bibliometrics.py query scopus --sql "SELECT DISTINCT title, papers.citedby
+###        FROM paperplaces JOIN papers ON papers.id = paper WHERE place = 'Duke University'
+###        AND paperplaces.conference = 'ICLR' AND paperplaces.year = 2019 AND paperplaces.citedby > 100"
+###
+
+import json
+import os
+import sqlite3
+
+import numpy as np
+
+import pubdata
+import scopusdata
+from universities import *
+from instrument import stage, count
+
+storefile = 'data/bibliometrics.sqlite'
+
+schema = {
+    'scopus': ["CREATE TABLE IF NOT EXISTS papers (id INTEGER PRIMARY KEY, title TEXT, year INTEGER, "
+               "conference TEXT, conferencename TEXT, citedby INTEGER, doi TEXT, eid TEXT)",
+               "CREATE TABLE IF NOT EXISTS paperplaces (paper INTEGER, affiliation TEXT, place TEXT, "
+               "conference TEXT, year INTEGER, citedby INTEGER)",
+               "CREATE INDEX IF NOT EXISTS papers_conference ON papers (conference, year)",
+               "CREATE INDEX IF NOT EXISTS paperplaces_place ON paperplaces (place, conference, year, paper)"],
+    'pubs': ["CREATE TABLE IF NOT EXISTS scores (university TEXT, area TEXT, year INTEGER, score REAL)",
+             "CREATE INDEX IF NOT EXISTS scores_university ON scores (university, area, year, score)"],
+}
+
+def connect(fname=storefile):
+    conn = sqlite3.connect(fname)
+    conn.execute("CREATE TABLE IF NOT EXISTS sources (dataset TEXT PRIMARY KEY, key TEXT)")
+    for statements in schema.values():
+        for statement in statements:
+            conn.execute(statement)
+    return conn
+
+def source_key(dataset):
+    """
+    What the stored tables for dataset depend on, as a string: the source files' sizes
+    and mtimes and the cleaning settings, including how affiliations resolve.
+    """
+
+    if dataset == 'pubs':
+        key = pubdata.cache_key(pubdata.datafile)
+    else:
+        key = {'files': [(fname, conf, os.stat(fname).st_size, os.stat(fname).st_mtime_ns)
+                         for (fname, conf) in scopusdata.datafiles],
+               'resolver': resolver.fingerprint()}
+    return json.dumps(key, sort_keys=True)
+
+def is_fresh(conn, dataset):
+    row = conn.execute("SELECT key FROM sources WHERE dataset = ?", (dataset,)).fetchone()
+    return row is not None and row[0] == source_key(dataset)
+
+def load_scopus(conn, workers=None):
+    """
+    Replace the papers and paperplaces tables with the papers in the scopus datafiles,
+    without duplicates (see scopusdata.dedupe).
+    """
+
+    parts = scopusdata.read_parts(scopusdata.datafiles, workers)
+    newids = scopusdata.dedupe(parts)[1]
+    paperrows = []
+    placerows = []
+    for (part, newid) in zip(parts, newids):
+        conf = part['conference']
+        for (paper, pid) in zip(part['papers'], newid):
+            if pid is None:
+                continue
+            paperrows.append((pid, paper.title, paper.year, conf, paper.conference, paper.citedby,
+                              paper.doi, paper.eid))
+            for affiliation in paper.affiliations.split(';'):
+                placerows.append((pid, affiliation, resolver.resolve(affiliation), conf,
+                                  paper.year, paper.citedby))
+
+    with conn:
+        conn.execute("DELETE FROM papers")
+        conn.execute("DELETE FROM paperplaces")
+        conn.executemany("INSERT INTO papers VALUES (?, ?, ?, ?, ?, ?, ?, ?)", paperrows)
+        conn.executemany("INSERT INTO paperplaces VALUES (?, ?, ?, ?, ?, ?)", placerows)
+        conn.execute("INSERT OR REPLACE INTO sources VALUES ('scopus', ?)", (source_key('scopus'),))
+    print("Stored papers: %d" % (len(paperrows)))
+    count('papers stored', len(paperrows))
+
+def load_pubs(conn):
+    """
+    Replace the scores table with the publication scores (through the column cache).
+    """
+
+    columns = pubdata.load_columns(pubdata.datafile)
+    univ = [universities[u] for u in columns['univ'].tolist()]
+    year = columns['year'].tolist()
+
+    with conn:
+        conn.execute("DELETE FROM scores")
+        for (i, area) in enumerate(pubdata.areas):
+            conn.executemany("INSERT INTO scores VALUES (?, ?, ?, ?)",
+                             zip(univ, [area] * len(year), year, columns['scores'][:, i].tolist()))
+        conn.execute("INSERT OR REPLACE INTO sources VALUES ('pubs', ?)", (source_key('pubs'),))
+    print("Stored scores: %d papers" % (len(year)))
+    count('papers stored', len(year))
+
+def open_store(datasets=('pubs', 'scopus'), fname=storefile, workers=None):
+    """
+    Connection to the store, with each of datasets loaded if it is missing or stale.
+    """
+
+    conn = connect(fname)
+    for dataset in datasets:
+        if is_fresh(conn, dataset):
+            print("Using stored %s: %s" % (dataset, fname))
+            continue
+        with stage('store ' + dataset):
+            if dataset == 'pubs':
+                load_pubs(conn)
+            else:
+                load_scopus(conn, workers)
+    return conn
+
+def place_counts(conn):
+    """
+    The scopusdata.PlaceCounts for the years in [minyear, maxyear], from the store.
+    """
+
+    years = (scopusdata.minyear, scopusdata.maxyear)
+    # a paper with several affiliations at one place is counted once
+    rows = conn.execute("SELECT place, conference, year, COUNT(*), SUM(citedby) FROM "
+                        "(SELECT DISTINCT place, conference, year, paper, citedby FROM paperplaces "
+                        " WHERE year BETWEEN ? AND ?) GROUP BY place, conference, year", years).fetchall()
+    rows += conn.execute("SELECT 'all', conference, year, COUNT(*), SUM(citedby) FROM papers "
+                         "WHERE year BETWEEN ? AND ? GROUP BY conference, year", years).fetchall()
+
+    placeindex = {'all': 0}
+    for row in rows:
+        placeindex.setdefault(row[0], len(placeindex))
+    confindex = {conf: i for i, conf in enumerate(sorted(set(row[1] for row in rows)))}
+
+    npapers = np.zeros((len(placeindex), len(confindex), len(scopusdata.allyears)), dtype=np.int64)
+    ncitings = np.zeros_like(npapers)
+    for (place, conf, year, papers, citings) in rows:
+        npapers[placeindex[place], confindex[conf], year - scopusdata.minyear] = papers
+        ncitings[placeindex[place], confindex[conf], year - scopusdata.minyear] = citings
+
+    return scopusdata.PlaceCounts(placeindex, confindex, npapers, ncitings)
+
+def score_cells(conn, t1=pubdata.t1, t2=pubdata.t2):
+    """
+    Same result as pubdata.aggregate for the stored scores.
+    """
+
+    cells = {prop: np.zeros((len(pubdata.areas), len(universities), len(pubdata.years)))
+             for prop in pubdata.properties}
+    rows = conn.execute("SELECT university, area, year, COUNT(*), SUM(score), SUM(score >= ?), SUM(score >= ?) "
+                        "FROM scores WHERE year BETWEEN ? AND ? GROUP BY university, area, year",
+                        (t1, t2, pubdata.startyear, pubdata.endyear))
+
+    for (univ, area, year, n, total, above1, above2) in rows:
+        cell = (pubdata.areas.index(area), universities.index(univ), year - pubdata.startyear)
+        cells['count'][cell] = n
+        cells['total_score'][cell] = total
+        cells['num_above_t1'][cell] = above1
+        cells['num_above_t2'][cell] = above2
+
+    return pubdata.set_means(cells)
+
+def query(conn, sql, params=()):
+    """
+    (column names, rows) for the sql query.
+    """
+
+    cursor = conn.execute(sql, params)
+    return [column[0] for column in cursor.description], cursor.fetchall()
@@ -2,7 +2,14 @@
 ### universities.py
 ###
 
+import hashlib
+import json
+import math
 import random
+import re
+from functools import lru_cache
+
+import numpy as np
 
 ### This file provides data and functions about universities that is useful for multiple analyses.
 
@@ -126,6 +133,26 @@ for u in uvapeers:
     if not u == 'University of Virginia':
         peers.append(u)
 
+# Comparison groups: each gets a rollup of the per-university aggregates (see membership
+# and pubdata.group_cells), so adding one costs nothing per paper read.
+groups = {
+    'peers': peers,
+    'selected': selected,
+    'instate': ['Virginia Tech'], # GMU is not in the pubtrends data
+    'outofstate': [u for u in peers if u != 'Virginia Tech'],
+}
+
+def membership(groups=groups, univs=universities):
+    """
+    univs x groups matrix, 1 where the university is in the group.
+    """
+
+    member = np.zeros((len(univs), len(groups)))
+    for (g, group) in enumerate(groups.values()):
+        for univ in group:
+            member[univs.index(univ), g] = 1
+    return member
+
 ucolor = {
     'University of Virginia': '#E57200', #'#232D4B', # UVA Blue (#E57200, # UVA Orange) from https://brand.virginia.edu/design-assets/colors
     'Emory University': '#007dba', # light blue
@@ -159,7 +186,7 @@ ucolor = {
     'all': 'black'
 }
 
-def cleanAffiliation(affiliation):
+def cleanAffiliation(affiliation, canonical=canonicalize, skip=skipaffiliations):
     """
     Attempt to extract the most useful institution name from the kludgey affiliation.
     """
@@ -171,13 +198,13 @@ def cleanAffiliation(affiliation):
     for affname in affiliation.split(','):
         affname = affname.strip()
 
-        affname.replace("Univeristy", "University")
-        affname.replace("University of California", "UC")
+        affname = affname.replace("Univeristy", "University")
+        affname = affname.replace("University of California", "UC")
         
-        if affname in canonicalize:
-            affname = canonicalize[affname]
+        if affname in canonical:
+            affname = canonical[affname]
             
-        if affname in skipaffiliations:
+        if affname in skip:
             continue
 
         if affname.startswith("Department") or affname.startswith("Dept"):
@@ -202,6 +229,208 @@ def cleanAffiliation(affiliation):
 
     return univaffil
 
+abbreviations = {'univ': 'university', 'inst': 'institute', 'st': 'state', 'dept': 'department'}
+
+class Codebook:
+    """
+    Dictionary encoding of names (universities, places, affiliations, conference names):
+    each distinct name gets a small integer code, in order of first appearance, so the
+    structures built per row hold ints and names are looked up only for output.
+    """
+
+    def __init__(self, names=()):
+        self.names = []
+        self.index = {}
+        for name in names:
+            self.code(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def code(self, name):
+        code = self.index.get(name)
+        if code is None:
+            code = self.index[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def encode(self, names):
+        """
+        Array of the codes of names, adding any new ones.
+        """
+
+        return np.fromiter(map(self.code, names), dtype=np.int64, count=len(names))
+
+def place_codebook():
+    """
+    A Codebook for places, starting with 'all', None (for affiliations that do not
+    resolve) and the canonical names, so those have the same codes in every process.
+    """
+
+    canonical = sorted(set(canonicalize.values()) - set(universities))
+    return Codebook(['all', None] + universities + ['George Mason University'] + canonical)
+
+def normalize(name):
+    # lower case words, without 'the' and punctuation and with common abbreviations
+    # spelled out, for comparing names
+    words = re.sub(r'[^a-z0-9]+', ' ', name.lower()).split()
+    return ' '.join(abbreviations.get(word, word) for word in words if word != 'the')
+
+class FuzzyIndex:
+    """
+    Finds the known institution nearest to a variant name (typos, missing words, 'The',
+    punctuation).  Names are compared by their character n-grams; an inverted index from
+    n-gram to names means a lookup only scores the names sharing an n-gram with it,
+    never the whole list.  The score is the shared n-grams over those of the longer
+    name, so a name with extra words (University of Texas at Dallas) does not match a
+    shorter one (University of Texas).
+
+    Common n-grams (' un', 'ity') are posted to nearly every name, so a lookup only
+    follows the postings of its rarest n-grams: a name sharing at least cutoff of the
+    lookup's n-grams must share one of the rarest len - ceil(cutoff * len) + 1 of them
+    (prefix filtering).  Names that cannot reach the cutoff are never scored, and most
+    lookups that match nothing are rejected without touching the postings.
+    """
+
+    def __init__(self, names, cutoff=0.85, n=3):
+        """
+        names maps each known name or variant to its canonical name.  Matches scoring
+        below cutoff are rejected.
+        """
+
+        self.names = dict(names)
+        self.cutoff = cutoff
+        self.n = n
+        self.canonical = []
+        self.grams = []
+        self.postings = {}
+
+        for (name, canonical) in names.items():
+            grams = self.ngrams(name)
+            i = len(self.canonical)
+            self.canonical.append(canonical)
+            self.grams.append(grams)
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(i)
+
+        # n-grams rarest first, for the prefix
+        self.ranked = sorted(self.postings, key=lambda gram: len(self.postings[gram]))
+        self.rank = {gram: rank for (rank, gram) in enumerate(self.ranked)}
+
+    def ngrams(self, name):
+        padded = ' ' + normalize(name) + ' '
+        return frozenset(map(''.join, zip(*[padded[k:] for k in range(self.n)])))
+
+    def match(self, name):
+        """
+        (canonical name, score) of the best match for name, or (None, 0.0) if no name
+        scores at least the cutoff.
+        """
+
+        grams = self.ngrams(name)
+        need = math.ceil(self.cutoff * len(grams) - 1e-9)
+        shared = sorted(self.rank[gram] for gram in grams if gram in self.rank)
+        if not grams or len(shared) < need:
+            return None, 0.0
+
+        candidates = set()
+        for rank in shared[:len(shared) - need + 1]:
+            candidates.update(self.postings[self.ranked[rank]])
+
+        (best, bestscore) = (None, 0.0)
+        for i in candidates:
+            score = len(grams & self.grams[i]) / max(len(grams), len(self.grams[i]))
+            if score > bestscore or (score == bestscore and i < best):
+                (best, bestscore) = (i, score)
+        if best is None or bestscore < self.cutoff:
+            return None, 0.0
+        return self.canonical[best], bestscore
+
+def known_names():
+    """
+    Every institution name in this file (including the canonicalize variants) mapped to
+    its canonical name, for the FuzzyIndex.
+    """
+
+    names = {}
+    for name in list(universities) + ['George Mason University'] + list(uname) + list(ucolor):
+        if name not in groups and name != 'all':
+            names[name] = canonicalize.get(name, name)
+    for (variant, canonical) in canonicalize.items():
+        names[variant] = canonical
+        names.setdefault(canonical, canonical)
+    return names
+
+class AffiliationResolver:
+    """
+    cleanAffiliation with a bounded cache, since the same raw affiliation strings show up
+    over and over (once per row in pubtrends, once per paper-affiliation in scopus).
+    Cleaned names that are not known institutions are matched with the fuzzy index, if
+    any, and kept as they are if nothing is close enough.
+    """
+
+    def __init__(self, canonical=canonicalize, skip=skipaffiliations, maxsize=1 << 18, fuzzy=None):
+        self.canonical = canonical
+        self.skip = skip
+        self.fuzzy = fuzzy
+        self.known = set(fuzzy.canonical) if fuzzy else set(known_names().values())
+        self.resolve = lru_cache(maxsize=maxsize)(self.clean)
+        # many raw affiliations clean to the same name, so matches are cached separately
+        self.nearest = lru_cache(maxsize=maxsize)(self.match)
+
+    def clean(self, affiliation):
+        name = cleanAffiliation(affiliation, self.canonical, self.skip)
+        if self.fuzzy is None or name is None or name in self.known:
+            return name
+        return self.nearest(name)
+
+    def match(self, name):
+        (match, score) = self.fuzzy.match(name)
+        return match if match is not None else name
+
+    def classify(self, affiliation, name):
+        """
+        For affiliation and the name it resolves to: 'known' if that is a known
+        institution found directly, 'matched' if found through the fuzzy index, and
+        'unknown' otherwise (including names that are None or '').
+        """
+
+        if not name or name not in self.known:
+            return 'unknown'
+        if cleanAffiliation(affiliation, self.canonical, self.skip) == name:
+            return 'known'
+        return 'matched'
+
+    def fingerprint(self):
+        """
+        Hash of everything resolve depends on (the canonical names, the skipped names,
+        the abbreviations and the fuzzy index's names and cutoff), for the caches of
+        resolved names to tell when they are stale.
+        """
+
+        rules = {'canonical': sorted(self.canonical.items()), 'skip': sorted(self.skip),
+                 'abbreviations': sorted(abbreviations.items())}
+        if self.fuzzy is not None:
+            rules['fuzzy'] = {'names': sorted(self.fuzzy.names.items()), 'cutoff': self.fuzzy.cutoff,
+                              'n': self.fuzzy.n}
+        return hashlib.sha1(json.dumps(rules).encode()).hexdigest()
+
+    def encode(self, raws, names=None):
+        """
+        Resolve a sequence of raw affiliation strings, cleaning each distinct string only
+        once.  Returns (codes, names), where codes is an integer array indexing names.  If
+        names is given, affiliations that resolve to something not in it get code -1;
+        otherwise names is the sorted list of the distinct resolved names.
+        """
+
+        resolved = {raw: self.resolve(raw) for raw in set(raws)}
+        if names is None:
+            names = sorted(set(name for name in resolved.values() if name is not None))
+        index = Codebook(names).index
+
+        code = {raw: index.get(name, -1) for raw, name in resolved.items()}
+        return np.fromiter(map(code.__getitem__, raws), dtype=np.int64, count=len(raws)), names
+
 def university_name(univ):
     if univ in uname:
         return uname[univ]
@@ -217,4 +446,6 @@ def university_color(univ):
         ucolor[univ] = "#{0:02x}{1:02x}{2:02x}".format(random.choice(range(256)),
                                                        random.choice(range(256)),
                                                        random.choice(range(256)))
-        return ucolor[univ]
\ No newline at end of file
+        return ucolor[univ]
+
+resolver = AffiliationResolver(fuzzy=FuzzyIndex(known_names()))